@@ -0,0 +1,251 @@
+import math
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+
+###Compact binary animation clip (.mtclip). Pure Python, no Maya needed.
+###
+###All values little-endian.
+###    header        magic "MTCL", version u16, flags u16, frame rate f32,
+###                  first frame i32, frame count u32, joint count u32,
+###                  joint table, track table and data offsets (u32 each)
+###    joint table   per joint: parent i16 (-1 for roots), name length u16, utf-8 name
+###    track table   per joint, fixed 32 bytes: animated mask u8 + 3 pad bytes,
+###                  then 7 u32 slots (tx ty tz, rotation, sx sy sz)
+###    data          animated float channels as frame count f32,
+###                  rotations as unit quaternions (x y z w), int16 quantized,
+###                  one sample when constant, frame count samples otherwise
+###
+###A constant translate/scale channel stores its value directly in its f32 slot
+###(constant-track elimination). Every other slot holds a data offset.
+
+magic = b'MTCL'
+version = 1
+
+headerStruct = struct.Struct('<4sHHfiIIIII')
+jointStruct = struct.Struct('<hH')
+trackStruct = struct.Struct('<B3x7I')
+
+rotationSlot = 3
+quantizeScale = 32767.0
+
+# Channel tolerance under which a translate/scale track counts as constant
+constantTolerance = 1e-6
+
+
+def eulerToQuaternion(rotate, order=0, jointOrient=(0.0, 0.0, 0.0)):
+
+    # Maya rotate (degrees, rotateOrder index) followed by the joint orient,
+    # as a unit quaternion (x, y, z, w)
+    def axisQuaternion(axis, degrees):
+        half = math.radians(degrees) * 0.5
+        quat = [0.0, 0.0, 0.0, math.cos(half)]
+        quat[axis] = math.sin(half)
+        return quat
+
+    def multiply(a, b):
+        ax, ay, az, aw = a
+        bx, by, bz, bw = b
+        return [aw * bx + ax * bw + ay * bz - az * by,
+                aw * by - ax * bz + ay * bw + az * bx,
+                aw * bz + ax * by - ay * bx + az * bw,
+                aw * bw - ax * bx - ay * by - az * bz]
+
+    orders = ('xyz', 'yzx', 'zxy', 'xzy', 'yxz', 'zyx')
+
+    quat = [0.0, 0.0, 0.0, 1.0]
+    for axisName in orders[order]:
+        axis = 'xyz'.index(axisName)
+        quat = multiply(axisQuaternion(axis, rotate[axis]), quat)
+    for axis in range(3):
+        quat = multiply(axisQuaternion(axis, jointOrient[axis]), quat)
+
+    return quat
+
+def quantize(quat):
+
+    return tuple(max(-32767, min(32767, int(round(component * quantizeScale)))) for component in quat)
+
+def writeClip(filePath, joints, parents, frameRate, firstFrame, translations, rotations, scales):
+
+    # translations/scales: per joint, a list of (x, y, z) per frame.
+    # rotations: per joint, a list of (x, y, z, w) unit quaternions per frame.
+    frameCount = len(translations[0]) if translations else 0
+
+    jointTable = bytearray()
+    for name, parent in zip(joints, parents):
+        encoded = name.encode('utf-8')
+        jointTable += jointStruct.pack(parent, len(encoded)) + encoded
+    jointTable += b'\0' * (-len(jointTable) % 4)
+
+    jointTableOffset = headerStruct.size
+    trackTableOffset = jointTableOffset + len(jointTable)
+    dataOffset = trackTableOffset + trackStruct.size * len(joints)
+
+    trackTable = bytearray()
+    data = bytearray()
+
+    def addData(chunk):
+        offset = dataOffset + len(data)
+        data.extend(chunk)
+        return offset
+
+    for joint in range(len(joints)):
+        mask = 0
+        slots = []
+
+        for slot, samples, axis in ((0, translations, 0), (1, translations, 1), (2, translations, 2),
+                                    (rotationSlot, rotations, None),
+                                    (4, scales, 0), (5, scales, 1), (6, scales, 2)):
+            if axis is None:
+                # Keep neighbouring samples in the same hemisphere so
+                # interpolating between them takes the short way round
+                quats = []
+                previous = None
+                for quat in samples[joint]:
+                    if previous is not None and sum(a * b for a, b in zip(quat, previous)) < 0:
+                        quat = [-component for component in quat]
+                    previous = quat
+                    quats.append(quantize(quat))
+
+                if quats and all(quat == quats[0] for quat in quats):
+                    quats = quats[:1]
+                else:
+                    mask |= 1 << slot
+                slots.append(addData(struct.pack('<%dh' % (len(quats) * 4), *[c for quat in quats for c in quat])))
+                continue
+
+            values = [sample[axis] for sample in samples[joint]]
+            if values and max(values) - min(values) <= constantTolerance:
+                slots.append(struct.unpack('<I', struct.pack('<f', values[0]))[0])
+            else:
+                mask |= 1 << slot
+                slots.append(addData(struct.pack('<%df' % len(values), *values)))
+
+        trackTable += trackStruct.pack(mask, *slots)
+
+    header = headerStruct.pack(magic, version, 0, frameRate, int(firstFrame), frameCount, len(joints),
+                               jointTableOffset, trackTableOffset, dataOffset)
+
+    with open(filePath, 'wb') as clipFile:
+        clipFile.write(header)
+        clipFile.write(jointTable)
+        clipFile.write(trackTable)
+        clipFile.write(data)
+
+
+class ClipReader(object):
+
+    # Memory-mapped reader. Only the header and joint table are parsed up
+    # front; samples are decoded from the map on request.
+
+    def __init__(self, filePath):
+
+        self._file = open(filePath, 'rb')
+        self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (fileMagic, fileVersion, self.flags, self.frameRate, self.firstFrame, self.frameCount, jointCount,
+         jointTableOffset, self.trackTableOffset, self.dataOffset) = headerStruct.unpack_from(self.buffer, 0)
+
+        if fileMagic != magic or fileVersion > version:
+            self.close()
+            raise ValueError("%s is not a version %d clip file" % (filePath, version))
+
+        self.joints = []
+        self.parents = []
+        offset = jointTableOffset
+        for joint in range(jointCount):
+            parent, length = jointStruct.unpack_from(self.buffer, offset)
+            offset += jointStruct.size
+            self.joints.append(self.buffer[offset:offset + length].decode('utf-8'))
+            self.parents.append(parent)
+            offset += length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.buffer.close()
+        self._file.close()
+
+    def _track(self, joint):
+        entry = trackStruct.unpack_from(self.buffer, self.trackTableOffset + joint * trackStruct.size)
+        return entry[0], entry[1:]
+
+    def _channel(self, mask, slots, slot, frame):
+        if mask & (1 << slot):
+            return struct.unpack_from('<f', self.buffer, slots[slot] + 4 * frame)[0]
+        return struct.unpack('<f', struct.pack('<I', slots[slot]))[0]
+
+    def isAnimated(self, joint, slot):
+        return bool(self._track(joint)[0] & (1 << slot))
+
+    def translation(self, joint, frame):
+        mask, slots = self._track(joint)
+        return tuple(self._channel(mask, slots, slot, frame) for slot in (0, 1, 2))
+
+    def scale(self, joint, frame):
+        mask, slots = self._track(joint)
+        return tuple(self._channel(mask, slots, slot, frame) for slot in (4, 5, 6))
+
+    def rotation(self, joint, frame):
+        mask, slots = self._track(joint)
+        if not mask & (1 << rotationSlot):
+            frame = 0
+        quat = struct.unpack_from('<4h', self.buffer, slots[rotationSlot] + 8 * frame)
+        return tuple(component / quantizeScale for component in quat)
+
+    def sample(self, frame):
+        # (translation, rotation, scale) of every joint on a frame index
+        return [(self.translation(joint, frame), self.rotation(joint, frame), self.scale(joint, frame))
+                for joint in range(len(self.joints))]
+
+
+def benchmark(jointCount=100, frameCount=1000, filePath=None):
+
+    # Writes a synthetic clip, reads every sample back and reports timings
+    # and the largest rotation quantization error. Without a filePath the
+    # clip goes to a temporary file, removed afterwards.
+    removeFile = filePath is None
+    if removeFile:
+        handle, filePath = tempfile.mkstemp(suffix='.mtclip')
+        os.close(handle)
+
+    joints = ["joint%d" % joint for joint in range(jointCount)]
+    parents = [joint - 1 for joint in range(jointCount)]
+    translations = [[(float(joint), 0.0, 0.01 * frame if joint == 0 else 0.0) for frame in range(frameCount)] for joint in range(jointCount)]
+    rotations = [[eulerToQuaternion((frame * 0.5, joint, 0.0)) for frame in range(frameCount)] for joint in range(jointCount)]
+    scales = [[(1.0, 1.0, 1.0)] * frameCount for joint in range(jointCount)]
+
+    try:
+        startTime = time.time()
+        writeClip(filePath, joints, parents, 30.0, 0, translations, rotations, scales)
+        writeTime = time.time() - startTime
+
+        startTime = time.time()
+        maxError = 0.0
+        with ClipReader(filePath) as reader:
+            for frame in range(reader.frameCount):
+                for joint, (translate, rotate, scale) in enumerate(reader.sample(frame)):
+                    maxError = max(maxError, min(max(abs(a - b) for a, b in zip(rotate, rotations[joint][frame])),
+                                                 max(abs(a + b) for a, b in zip(rotate, rotations[joint][frame]))))
+        readTime = time.time() - startTime
+    finally:
+        if removeFile and os.path.exists(filePath):
+            os.remove(filePath)
+
+    print("%d joints x %d frames: write %.3fs, read %.3fs, max quaternion error %.6f"
+          % (jointCount, frameCount, writeTime, readTime, maxError))
+
+    return writeTime, readTime, maxError
+
+
+if __name__ == "__main__":
+
+    benchmark(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,965 @@
+import argparse
+import csv
+import hashlib
+import io
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import time
+from array import array
+from collections import namedtuple
+
+import maya.api.OpenMaya as om
+import maya.cmds as cmds
+import maya.mel as mel
+
+import AnimClipFormat
+import MayapyBatch
+from MayapyBatch import timed
+
+try:
+    import fbx
+except ImportError:
+    fbx = None
+
+###UI-free clip export steps, shared by AnimationClipExporter and the headless
+###batch mode. Run with mayapy:
+###    mayapy AnimClipPipeline.py scenes.json --workers 8 --summary summary.json
+###
+###The manifest is a list of scenes (or {"scenes": [...]}), each with:
+###    scene, root, clips (a list of clips or the path of a CSV/JSON clip
+###    list), folder, and optionally name, prefix, format (fbx or mtclip),
+###    multiple_files (defaults to true), file_name (single-file FBX),
+###    plane_bone, offset, scale, force, and import_references,
+###    remove_namespaces, filter_references, delete_namespaces, bake,
+###    delete_constraints and set_offset_scale to turn steps off (all default
+###    to true).
+###
+###    mayapy AnimClipPipeline.py --benchmark 50 1000 20
+###times sampling and export on a synthetic 50 joint, 1000 frame, 20 clip scene.
+
+
+frameRates = {'game': 15.0, 'film': 24.0, 'pal': 25.0, 'ntsc': 30.0, 'show': 48.0, 'palf': 50.0, 'ntscf': 60.0}
+
+# Curves keyed on time; set driven key curves (animCurveUA/UL/UU) are driven
+# by another attribute and still need baking
+timeCurveTypes = ['animCurveTL', 'animCurveTA', 'animCurveTU', 'animCurveTT']
+trsAttrs = set(attr + axis for attr in ("translate", "rotate", "scale") for axis in ("", "X", "Y", "Z"))
+
+# Maya rotateOrder index -> FbxEuler order (xyz, yzx, zxy, xzy, yxz, zyx)
+fbxRotateOrders = [0, 2, 4, 1, 3, 5]
+
+# Frame rate -> FbxTime mode name; any other rate is written as eCustom
+fbxTimeModes = {23.976: 'eFrames23_976', 24.0: 'eFrames24', 25.0: 'ePAL', 29.97: 'eNTSCFullFrame', 30.0: 'eFrames30',
+                48.0: 'eFrames48', 50.0: 'eFrames50', 59.94: 'eFrames59_94', 60.0: 'eFrames60', 72.0: 'eFrames72',
+                96.0: 'eFrames96', 100.0: 'eFrames100', 119.88: 'eFrames119_88', 120.0: 'eFrames120'}
+
+channelCount = 9
+
+# Marks a worker's progress lines among whatever Maya prints to stdout
+progressTag = "@@clipExport "
+
+# Sidecar in the export folder recording the input hash of every clip file
+exportManifestName = ".clipExport_manifest.json"
+
+# Bump whenever a writer's output changes, so every clip is exported again
+exportManifestVersion = 1
+
+# Reference file scans, keyed on (path, modification time, node name)
+referenceScans = {}
+
+referenceLineRe = re.compile(r'^file -r.*"([^"]+)";\s*$', re.S)
+
+
+class Clip(namedtuple('Clip', 'name start end options')):
+
+    # One take of the clip table: name, frame range and a dict of per-clip
+    # options, which travel with the clip through CSV/JSON and the workers
+    __slots__ = ()
+
+    def __new__(cls, name, start, end, options=None):
+        return super(Clip, cls).__new__(cls, name, float(start), float(end), dict(options or {}))
+
+def toClip(value):
+
+    # Clip from a Clip, a (name, start, end[, options]) sequence or a dict
+    if isinstance(value, Clip):
+        return value
+    if isinstance(value, dict):
+        return Clip(value['name'], value['start'], value['end'], value.get('options'))
+
+    return Clip(*value)
+
+def loadClipList(path):
+
+    # .csv: a name,start,end header, any further columns become options.
+    # .json: a list of {name, start, end, options} (or [name, start, end]).
+    if path.lower().endswith('.csv'):
+        with open(path) as clipFile:
+            clips = []
+            for row in csv.DictReader(clipFile):
+                options = dict((key, value) for key, value in row.items() if key not in ('name', 'start', 'end') and value)
+                clips.append(Clip(row['name'], row['start'], row['end'], options))
+            return clips
+
+    with open(path) as clipFile:
+        data = json.load(clipFile)
+
+    return [toClip(value) for value in (data['clips'] if isinstance(data, dict) else data)]
+
+def saveClipList(path, clips):
+
+    clips = [toClip(clip) for clip in clips]
+
+    if path.lower().endswith('.csv'):
+        optionNames = sorted(set(key for clip in clips for key in clip.options))
+        with open(path, 'w') as clipFile:
+            writer = csv.writer(clipFile, lineterminator='\n')
+            writer.writerow(['name', 'start', 'end'] + optionNames)
+            for clip in clips:
+                writer.writerow([clip.name, clip.start, clip.end] + [clip.options.get(key, '') for key in optionNames])
+        return
+
+    with open(path, 'w') as clipFile:
+        json.dump([clip._asdict() for clip in clips], clipFile, indent=1)
+
+
+def mergeRanges(ranges):
+
+    # Sorted union of (start, end) ranges, merged where they touch or overlap
+    ranges = sorted((min(frameRange), max(frameRange)) for frameRange in ranges)
+    if not ranges:
+        return []
+
+    merged = [list(ranges[0])]
+    for start, end in ranges[1:]:
+        if start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    return [tuple(frameRange) for frameRange in merged]
+
+def framesInRange(start, end):
+
+    return list(range(int(math.ceil(start)), int(math.floor(end)) + 1))
+
+def getFrameRate():
+
+    unit = cmds.currentUnit(q=True, time=True)
+    if unit in frameRates:
+        return frameRates[unit]
+
+    # Newer units come as e.g. "23.976fps"
+    return float(unit.replace('fps', ''))
+
+
+def referenceFileContains(filePath, nodeName, visited=None):
+
+    # Whether a scene file on disk holds a node called nodeName, without
+    # loading it into Maya. Maya ASCII files are read up to the node and
+    # follow their own references; Maya binary files are scanned for the
+    # name as a stored string. A file that can't be read counts as a match,
+    # so it is imported as before.
+    filePath = os.path.expandvars(filePath)
+    visited = set() if visited is None else visited
+    if filePath in visited:
+        return False
+    visited.add(filePath)
+
+    try:
+        key = (filePath, os.path.getmtime(filePath), nodeName)
+    except OSError:
+        return True
+    if key in referenceScans:
+        return referenceScans[key]
+
+    found = False
+    try:
+        if filePath.lower().endswith('.ma'):
+            nameFlags = ('-n "%s"' % nodeName, ':%s"' % nodeName)
+            children = []
+            # Undecodable bytes (paths saved under another code page) must not
+            # abort the scan
+            with io.open(filePath, encoding='utf-8', errors='replace') as sceneFile:
+                for line in sceneFile:
+                    if line.startswith('createNode') and any(flag in line for flag in nameFlags):
+                        found = True
+                        break
+                    if not line.startswith('file -r'):
+                        continue
+                    # Long reference statements wrap onto further lines
+                    while not line.rstrip().endswith(';'):
+                        nextLine = next(sceneFile, None)
+                        if nextLine is None:
+                            break
+                        line = line.rstrip('\r\n') + ' ' + nextLine.strip()
+                    match = referenceLineRe.match(line)
+                    if match:
+                        children.append(match.group(1))
+            if not found:
+                folder = os.path.dirname(filePath)
+                found = any(referenceFileContains(child if os.path.isabs(os.path.expandvars(child)) else os.path.join(folder, child),
+                                                  nodeName, visited) for child in children)
+        else:
+            pattern = nodeName.encode('utf-8') + b'\0'
+            tail = b''
+            with open(filePath, 'rb') as sceneFile:
+                for chunk in iter(lambda: sceneFile.read(1 << 20), b''):
+                    if pattern in tail + chunk:
+                        found = True
+                        break
+                    tail = chunk[-len(pattern):]
+    except (IOError, OSError):
+        return True
+
+    referenceScans[key] = found
+    return found
+
+def filterReferences(root, removeOthers=True):
+
+    # Loads the top-level references whose file holds the root bone and
+    # removes (or, with removeOthers off, unloads) all the others before
+    # anything is imported. Works on scenes opened with loadReferenceDepth
+    # 'none'. Returns the references that were dropped.
+    rootName = root.split('|')[-1].split(':')[-1]
+
+    dropped = []
+    for ref in cmds.file(q=True, reference=True) or []:
+        refNode = cmds.referenceQuery(ref, referenceNode=True)
+        filePath = cmds.referenceQuery(ref, filename=True, withoutCopyNumber=True)
+        loaded = cmds.referenceQuery(ref, isLoaded=True)
+
+        if referenceFileContains(filePath, rootName):
+            if not loaded:
+                cmds.file(ref, loadReference=refNode)
+            continue
+
+        if removeOthers:
+            cmds.file(ref, removeReference=True)
+        elif loaded:
+            cmds.file(unloadReference=refNode)
+        dropped.append(ref)
+
+    return dropped
+
+def importReferences(removeNamespace=True):
+
+    # Imports every loaded top-level reference into the scene
+    imported = []
+    for ref in cmds.file(q=True, reference=True) or []:
+        if not cmds.referenceQuery(ref, isLoaded=True):
+            continue
+
+        namespace = cmds.referenceQuery(ref, namespace=True)
+        cmds.file(ref, importReference=True)
+        if removeNamespace and cmds.namespace(exists=namespace):
+            cmds.namespace(removeNamespace=namespace, mergeNamespaceWithParent=True)
+        imported.append(ref)
+
+    return imported
+
+def deleteNamespaces():
+
+    # Merges every namespace, nested ones included, deepest first, so each
+    # merge only moves nodes one level up and no parent is merged before
+    # its children are
+    defaults = ['UI', 'shared']
+    namespaces = [ns for ns in cmds.namespaceInfo(':', listOnlyNamespaces=True, recurse=True) or []
+                  if ns.split(':')[0] not in defaults]
+    namespaces.sort(key=lambda ns: ns.count(':'), reverse=True)
+
+    for ns in namespaces:
+        cmds.namespace(removeNamespace=ns, mergeNamespaceWithParent=True)
+
+    return namespaces
+
+def getDrivenJoints(root):
+
+    # Joints under the root whose transform channels are fed by anything
+    # other than a time-driven animation curve (constraints, expressions,
+    # set driven keys, other rigs). All incoming connections come back from a
+    # single query.
+    joints = cmds.ls(root, type='joint') + (cmds.listRelatives(root, ad=True, type='joint', fullPath=True) or [])
+    if not joints:
+        return []
+
+    connections = cmds.listConnections(joints, s=True, d=False, c=True, p=True, skipConversionNodes=True) or []
+    plugs = list(zip(connections[::2], connections[1::2]))
+    curves = set(cmds.ls(list(set(src.split('.')[0] for dst, src in plugs)), type=timeCurveTypes))
+
+    driven = []
+    for dst, src in plugs:
+        node, attr = dst.split('.', 1)
+        if attr in trsAttrs and src.split('.')[0] not in curves and node not in driven:
+            driven.append(node)
+
+    return driven
+
+def bakeKeys(root, ranges, suspendRefresh=True):
+
+    # Bakes the driven joints under the root over each range. Returns the
+    # baked joints.
+    driven = getDrivenJoints(root)
+
+    if driven:
+
+        # Viewport refresh and cached playback would only slow the bake down
+        if suspendRefresh:
+            cmds.refresh(suspend=True)
+        try:
+            cacheEnabled = cmds.evaluator(name="cache", q=True, enable=True)
+        except RuntimeError:
+            cacheEnabled = False
+        if cacheEnabled:
+            cmds.evaluator(name="cache", enable=False)
+
+        try:
+            # Implicit control (the constraints) is only turned off after the
+            # last range, so every range is baked from the live constraints
+            for index, frameRange in enumerate(ranges):
+                cmds.bakeResults(driven, sm=True, hi="none", t=tuple(frameRange), preserveOutsideKeys=True,
+                                 disableImplicitControl=(index == len(ranges) - 1))
+        finally:
+            if cacheEnabled:
+                cmds.evaluator(name="cache", enable=True)
+            if suspendRefresh:
+                cmds.refresh(suspend=False)
+
+    return driven
+
+def clearPlaneBone(planeBone):
+
+    for attr in ("translate", "rotate"):
+        cmds.cutKey(planeBone, cl=True, t=":", hi="none", at=attr)
+
+def deleteConstraints(root):
+
+    # One typed query for the constraints and one delete for all of them
+    constraints = cmds.listRelatives(root, ad=True, type=['parentConstraint', 'scaleConstraint'], fullPath=True) or []
+    if constraints:
+        cmds.delete(constraints)
+
+    return constraints
+
+def resolveNode(name):
+
+    # A node typed by name, found as typed or, once the namespaces have been
+    # merged, by its name without them
+    for candidate in (name, name.split('|')[-1].split(':')[-1]):
+        if cmds.objExists(candidate):
+            return candidate
+
+    raise ValueError("%s not found, please set correct bone name" % name)
+
+def prepareScene(root, ranges=None, planeBone=None, importRefs=True, removeNamespaces=True, bake=True,
+                 deleteConstraint=True, removeImportNamespaces=True, filterRefs=True):
+
+    # Import references, merge namespaces, bake and delete constraints as one
+    # stage: a single undo chunk with the viewport suspended throughout.
+    # The root and plane bone are given by name and only have to exist once
+    # the references are imported and the namespaces merged; ValueError if
+    # they don't. Returns {step: {'count': n, 'elapsed': seconds}} for the
+    # steps that ran.
+    report = {}
+
+    def step(name, func, *args, **kwargs):
+        startTime = time.time()
+        result = func(*args, **kwargs)
+        report[name] = {'count': len(result), 'elapsed': time.time() - startTime}
+
+    cmds.undoInfo(openChunk=True, chunkName="prepareScene")
+    cmds.refresh(suspend=True)
+    try:
+        if importRefs and filterRefs:
+            step('filterReferences', filterReferences, root)
+        if importRefs:
+            # With every namespace merged below, imports skip their own merge
+            step('importReferences', importReferences, removeImportNamespaces and not removeNamespaces)
+        if removeNamespaces:
+            step('deleteNamespaces', deleteNamespaces)
+
+        root = resolveNode(root)
+        if planeBone:
+            planeBone = resolveNode(planeBone)
+
+        if bake:
+            if ranges is None:
+                ranges = [(cmds.playbackOptions(q=True, min=True), cmds.playbackOptions(q=True, max=True))]
+            step('bake', bakeKeys, root, ranges, False)
+            if planeBone:
+                clearPlaneBone(planeBone)
+        if deleteConstraint:
+            step('deleteConstraints', deleteConstraints, root)
+    finally:
+        cmds.refresh(suspend=False)
+        cmds.undoInfo(closeChunk=True)
+
+    return report
+
+def setOffsetAndScale(root, offset, scale, timeline):
+
+    # The values are constant over the take, so the curves only need flat,
+    # stepped keys at both ends of the range. They are written directly at
+    # those times instead of stepping the timeline through every frame.
+    cmds.undoInfo(openChunk=True, chunkName="setOffsetAndScale")
+    cmds.refresh(suspend=True)
+    try:
+        cmds.cutKey(root, cl=True, t=":", hi="none", at="translate")
+        cmds.cutKey(root, cl=True, t=":", hi="none", at="scale")
+
+        cmds.move(offset[0], offset[1], offset[2], root, a=True)
+        cmds.scale(scale[0], scale[1], scale[2], root)
+
+        for attr in ("translate", "scale"):
+            values = cmds.getAttr("%s.%s" % (root, attr))[0]
+            for axis, value in zip("XYZ", values):
+                for frame in sorted(set(timeline)):
+                    cmds.setKeyframe(root, at=attr + axis, t=frame, v=value, itt="flat", ott="step")
+    finally:
+        cmds.refresh(suspend=False)
+        cmds.undoInfo(closeChunk=True)
+
+
+class ClipSampleStore(object):
+
+    # Local translate/rotate/scale of every joint under the root, sampled once
+    # over the union of the clip ranges into one flat array of doubles laid
+    # out frame by frame, joint by joint, channel by channel. Clips are then
+    # read as slices of it, without evaluating the scene again.
+
+    def __init__(self, root, ranges):
+
+        paths = cmds.ls(root, type='joint', long=True) + (cmds.listRelatives(root, ad=True, type='joint', fullPath=True) or [])
+        paths.sort(key=lambda path: path.count('|'))
+
+        indexByPath = dict((path, index) for index, path in enumerate(paths))
+
+        self.root = root
+        self.joints = [path.split('|')[-1] for path in paths]
+        self.parents = [indexByPath.get(path.rsplit('|', 1)[0], -1) for path in paths]
+        self.jointOrients = [tuple(cmds.getAttr(path + '.jointOrient')[0]) for path in paths]
+        self.rotateOrders = [cmds.getAttr(path + '.rotateOrder') for path in paths]
+        self.paths = paths
+
+        self.frameRate = getFrameRate()
+        self.linearUnit = cmds.currentUnit(q=True, linear=True)
+        self.frames = sorted(set(frame for frameRange in mergeRanges(ranges) for frame in framesInRange(*frameRange)))
+        self.rowByFrame = dict((frame, row) for row, frame in enumerate(self.frames))
+        self.data = array('d')
+
+    def sample(self):
+
+        # One time context per frame, read by the channel plugs of every joint
+        # through the API, so the timeline never moves and there is no getAttr
+        # round trip per channel. Plugs give internal units (cm, radians);
+        # they are scaled to the UI units getAttr returns.
+        toLinear = om.MDistance(1.0, om.MDistance.kCentimeters).asUnits(om.MDistance.uiUnit())
+        toAngle = om.MAngle(1.0, om.MAngle.kRadians).asUnits(om.MAngle.uiUnit())
+        units = [toLinear] * 3 + [toAngle] * 3 + [1.0] * 3
+
+        plugs = []
+        for path in self.paths:
+            selection = om.MSelectionList()
+            selection.add(path)
+            node = om.MFnDependencyNode(selection.getDependNode(0))
+            plugs.extend(node.findPlug(attr + axis, False) for attr in ("translate", "rotate", "scale") for axis in "XYZ")
+        units *= len(self.paths)
+
+        data = array('d')
+        for frame in self.frames:
+            context = om.MDGContext(om.MTime(frame, om.MTime.uiUnit()))
+            data.extend(plug.asDouble(context) * unit for plug, unit in zip(plugs, units))
+        self.data = data
+
+        return self
+
+    def sampleGetAttr(self):
+
+        # Original per-channel getAttr sampling, kept as the reference for
+        # benchmarkExport
+        data = array('d')
+        for frame in self.frames:
+            for path in self.paths:
+                data.extend(cmds.getAttr(path + '.translate', time=frame)[0])
+                data.extend(cmds.getAttr(path + '.rotate', time=frame)[0])
+                data.extend(cmds.getAttr(path + '.scale', time=frame)[0])
+        self.data = data
+
+        return self
+
+    def clipFrames(self, start, end):
+
+        return [frame for frame in framesInRange(start, end) if frame in self.rowByFrame]
+
+    def values(self, frame, joint):
+
+        # The 9 channels (tx ty tz rx ry rz sx sy sz) of a joint on a frame
+        offset = (self.rowByFrame[frame] * len(self.joints) + joint) * channelCount
+        return self.data[offset:offset + channelCount]
+
+    def track(self, joint, channel, start, end):
+
+        return [self.values(frame, joint)[channel] for frame in self.clipFrames(start, end)]
+
+    def clipData(self, start, end):
+
+        # The samples of a clip as one slice; the clip's rows are contiguous
+        frames = self.clipFrames(start, end)
+        if not frames:
+            return array('d')
+
+        rowSize = len(self.joints) * channelCount
+        return self.data[self.rowByFrame[frames[0]] * rowSize:(self.rowByFrame[frames[-1]] + 1) * rowSize]
+
+
+def writeFbxClip(store, name, start, end, filePath):
+
+    # Writes one clip as a skeleton plus a single animation stack through the
+    # FBX Python SDK, straight from the sample store
+    manager = fbx.FbxManager.Create()
+    manager.SetIOSettings(fbx.FbxIOSettings.Create(manager, fbx.IOSROOT))
+    scene = fbx.FbxScene.Create(manager, name)
+
+    units = {'mm': fbx.FbxSystemUnit.mm, 'cm': fbx.FbxSystemUnit.cm, 'm': fbx.FbxSystemUnit.m,
+             'in': fbx.FbxSystemUnit.Inch, 'ft': fbx.FbxSystemUnit.Foot, 'yd': fbx.FbxSystemUnit.Yard}
+    scene.GetGlobalSettings().SetSystemUnit(units.get(store.linearUnit, fbx.FbxSystemUnit.cm))
+
+    # The scene's rate travels with the file, or readers resample it as 30 fps
+    modeName = next((name for rate, name in fbxTimeModes.items() if abs(rate - store.frameRate) < 1e-3), None)
+    timeMode = getattr(fbx.FbxTime, modeName, None) if modeName else None
+    if timeMode is None:
+        timeMode = fbx.FbxTime.eCustom
+        scene.GetGlobalSettings().SetCustomFrameRate(store.frameRate)
+    scene.GetGlobalSettings().SetTimeMode(timeMode)
+
+    nodes = []
+    for index, joint in enumerate(store.joints):
+        skeleton = fbx.FbxSkeleton.Create(scene, joint)
+        skeleton.SetSkeletonType(fbx.FbxSkeleton.eRoot if store.parents[index] < 0 else fbx.FbxSkeleton.eLimbNode)
+
+        node = fbx.FbxNode.Create(scene, joint)
+        node.SetNodeAttribute(skeleton)
+        node.SetRotationActive(True)
+        node.SetRotationOrder(fbx.FbxNode.eSourcePivot, fbxRotateOrders[store.rotateOrders[index]])
+        node.SetPreRotation(fbx.FbxNode.eSourcePivot, fbx.FbxVector4(*store.jointOrients[index]))
+
+        parent = scene.GetRootNode() if store.parents[index] < 0 else nodes[store.parents[index]]
+        parent.AddChild(node)
+        nodes.append(node)
+
+    stack = fbx.FbxAnimStack.Create(scene, name)
+    layer = fbx.FbxAnimLayer.Create(scene, "Base Layer")
+    stack.AddMember(layer)
+
+    frames = store.clipFrames(start, end)
+    times = []
+    for frame in frames:
+        keyTime = fbx.FbxTime()
+        keyTime.SetSecondDouble(frame / store.frameRate)
+        times.append(keyTime)
+
+    if times:
+        stack.SetLocalTimeSpan(fbx.FbxTimeSpan(times[0], times[-1]))
+
+    for index, node in enumerate(nodes):
+        for offset, prop in ((0, node.LclTranslation), (3, node.LclRotation), (6, node.LclScaling)):
+            for axis, component in enumerate(("X", "Y", "Z")):
+                curve = prop.GetCurve(layer, component, True)
+                curve.KeyModifyBegin()
+                for keyTime, value in zip(times, store.track(index, offset + axis, start, end)):
+                    key = curve.KeyAdd(keyTime)[0]
+                    curve.KeySetValue(key, value)
+                    curve.KeySetInterpolation(key, fbx.FbxAnimCurveDef.eInterpolationLinear)
+                curve.KeyModifyEnd()
+
+    exporter = fbx.FbxExporter.Create(manager, "")
+    try:
+        if not exporter.Initialize(filePath, -1, manager.GetIOSettings()):
+            raise IOError("Could not write %s: %s" % (filePath, exporter.GetStatus().GetErrorString()))
+        exporter.Export(scene)
+    finally:
+        exporter.Destroy()
+        manager.Destroy()
+
+def writeNativeClip(store, name, start, end, filePath):
+
+    # Writes one clip in the compact .mtclip format (see AnimClipFormat),
+    # with rotate and joint orient folded into one quaternion per sample
+    frames = store.clipFrames(start, end)
+
+    translations = []
+    rotations = []
+    scales = []
+    for joint in range(len(store.joints)):
+        samples = [store.values(frame, joint) for frame in frames]
+        translations.append([tuple(values[0:3]) for values in samples])
+        rotations.append([AnimClipFormat.eulerToQuaternion(values[3:6], store.rotateOrders[joint], store.jointOrients[joint])
+                          for values in samples])
+        scales.append([tuple(values[6:9]) for values in samples])
+
+    AnimClipFormat.writeClip(filePath, store.joints, store.parents, store.frameRate, frames[0] if frames else 0,
+                             translations, rotations, scales)
+
+# Export backends: name -> (clip writer, file extension)
+exportFormats = {
+    'fbx': (writeFbxClip, '.fbx'),
+    'mtclip': (writeNativeClip, '.mtclip'),
+}
+
+def getExportSettings(root, planeBone=None, offset=(0, 0, 0), scale=(1, 1, 1), exportFormat='fbx', prefix=""):
+
+    # Every option that changes a clip file besides its samples; part of
+    # each clip's hash in the export manifest
+    return {
+        "root": root,
+        "planeBone": planeBone,
+        "offset": [float(value) for value in offset],
+        "scale": [float(value) for value in scale],
+        "format": exportFormat,
+        "prefix": prefix,
+    }
+
+def getClipWriter(exportFormat):
+
+    # Without the FBX Python SDK, FBX clips go through one FBXExport each
+    if exportFormat == 'fbx' and fbx is None:
+        return (lambda store, name, start, end, filePath: exportClipFbxPlugin(store.root, name, start, end, filePath)), '.fbx'
+
+    return exportFormats[exportFormat]
+
+def getClipPath(folder, prefix, name, extension):
+
+    filePath = os.path.join(folder, prefix + name)
+    if not filePath.lower().endswith(extension):
+        filePath += extension
+
+    return filePath
+
+def hashClip(store, start, end, settings=None):
+
+    # Everything a clip file is built from: its samples, the skeleton they
+    # belong to, the scene units and the export settings (root and plane
+    # bone, offset, scale, format...)
+    digest = hashlib.sha1()
+    digest.update(json.dumps([exportManifestVersion, store.clipFrames(start, end), store.joints, store.parents,
+                              store.jointOrients, store.rotateOrders, store.frameRate, store.linearUnit,
+                              settings or {}], sort_keys=True).encode('utf-8'))
+    digest.update(store.clipData(start, end))
+
+    return digest.hexdigest()
+
+def ensureFolder(folder):
+
+    # Output trees may not exist yet, and parallel workers can race to make them
+    if folder and not os.path.isdir(folder):
+        try:
+            os.makedirs(folder)
+        except OSError:
+            if not os.path.isdir(folder):
+                raise
+
+def loadExportManifest(folder):
+
+    manifestPath = os.path.join(folder, exportManifestName)
+    if not os.path.isfile(manifestPath):
+        return {}
+
+    try:
+        with open(manifestPath) as manifestFile:
+            return json.load(manifestFile)
+    except ValueError:
+        return {}
+
+def updateExportManifest(folder, hashes):
+
+    # Merges {clip file name: hash} into the folder's manifest
+    ensureFolder(folder)
+    manifestPath = os.path.join(folder, exportManifestName)
+    manifest = loadExportManifest(folder)
+    manifest.update(hashes)
+
+    tmpPath = manifestPath + '.tmp'
+    with open(tmpPath, 'w') as manifestFile:
+        json.dump(manifest, manifestFile, indent=1, sort_keys=True)
+
+    if os.path.exists(manifestPath):
+        os.remove(manifestPath)
+    os.rename(tmpPath, manifestPath)
+
+def exportClip(store, clip, folder, prefix, exportFormat, settings, manifest, force=False):
+
+    # Writes one clip unless the manifest already holds its hash and the file
+    # is still there. Returns (filePath, hash, written).
+    writer, extension = getClipWriter(exportFormat)
+    filePath = getClipPath(folder, prefix, clip.name, extension)
+    clipHash = hashClip(store, clip.start, clip.end, dict(settings or {}, options=clip.options))
+
+    if not force and manifest.get(os.path.basename(filePath)) == clipHash and os.path.isfile(filePath):
+        return filePath, clipHash, False
+
+    writer(store, clip.name, clip.start, clip.end, filePath)
+
+    return filePath, clipHash, True
+
+def exportClipsFromStore(root, clips, folder, prefix="", exportFormat='fbx', settings=None, force=False):
+
+    # Samples the skeleton once over every clip, then writes each changed
+    # clip's file from its slice of the store. clips is a list of Clips.
+    # Returns the written and the skipped file paths.
+    clips = [toClip(clip) for clip in clips]
+    ensureFolder(folder)
+    store = ClipSampleStore(root, [(clip.start, clip.end) for clip in clips]).sample()
+    manifest = loadExportManifest(folder)
+
+    written = []
+    skipped = []
+    hashes = {}
+    for clip in clips:
+        filePath, clipHash, changed = exportClip(store, clip, folder, prefix, exportFormat, settings, manifest, force)
+        (written if changed else skipped).append(filePath)
+        hashes[os.path.basename(filePath)] = clipHash
+
+    updateExportManifest(folder, hashes)
+
+    return written, skipped
+
+def exportClipFbxPlugin(root, name, start, end, filePath):
+
+    # One clip through the FBX plugin, the same settings the exporter dialog uses
+    exportTakesFbxPlugin(root, [Clip(name, start, end)], filePath)
+
+def exportTakesFbxPlugin(root, clips, filePath):
+
+    # Every clip as a take of one FBX file
+    mel.eval( "FBXExportAnimationOnly -v true;" )
+    mel.eval( "FBXExportDeleteOriginalTakeOnSplitAnimation -v true;" )
+    mel.eval( "FBXExportSplitAnimationIntoTakes -clear;" )
+    for clip in clips:
+        mel.eval( 'FBXExportSplitAnimationIntoTakes -v "%s" %s %s' % (clip.name, clip.start, clip.end) )
+
+    ensureFolder(os.path.dirname(filePath))
+    cmds.select(root, r=True)
+    mel.eval( 'FBXExport -f "%s" -s' % filePath.replace('\\', '/') )
+
+def benchmarkExport(jointCount=50, frameCount=1000, clipCount=20, folder=None):
+
+    # Builds a keyed synthetic chain in a new scene, then times the sampling
+    # (per-channel getAttr against one time context per frame) and the export
+    # of every clip (from the sample store against one FBXExport per clip)
+    cmds.file(new=True, force=True)
+    cmds.playbackOptions(min=1, max=frameCount)
+    if not cmds.pluginInfo('fbxmaya', q=True, loaded=True):
+        cmds.loadPlugin('fbxmaya')
+
+    cmds.select(cl=True)
+    joints = [cmds.joint(name="Bench_%03d_Bn" % index, p=(0, 1, 0), r=True) for index in range(jointCount)]
+    for index, joint in enumerate(joints):
+        for frame in range(1, frameCount + 1, 10):
+            for axis in "XYZ":
+                cmds.setKeyframe(joint, at='rotate' + axis, t=frame, v=((index + frame) % 90) - 45)
+            cmds.setKeyframe(joint, at='translateY', t=frame, v=1 + (index + frame) % 7 * 0.1)
+
+    root = cmds.ls(joints[0], long=True)[0]
+    length = max(1, frameCount // clipCount)
+    clips = [Clip("Bench_%02d" % index, 1 + index * length, (index + 1) * length) for index in range(clipCount)]
+    ranges = [(clip.start, clip.end) for clip in clips]
+    folder = folder or tempfile.mkdtemp(prefix='AnimClipPipeline_benchmark_')
+
+    results = {}
+
+    startTime = time.time()
+    reference = ClipSampleStore(root, ranges).sampleGetAttr()
+    results['sampleGetAttr'] = time.time() - startTime
+
+    startTime = time.time()
+    store = ClipSampleStore(root, ranges).sample()
+    results['sample'] = time.time() - startTime
+
+    error = max(abs(a - b) for a, b in zip(reference.data, store.data)) if store.data else 0.0
+
+    for exportFormat in ('fbx', 'mtclip'):
+        settings = getExportSettings(root, exportFormat=exportFormat)
+        startTime = time.time()
+        exportClipsFromStore(root, clips, folder, 'store_', exportFormat, settings, force=True)
+        results['store_' + exportFormat] = time.time() - startTime
+
+    startTime = time.time()
+    for clip in clips:
+        exportClipFbxPlugin(root, clip.name, clip.start, clip.end, getClipPath(folder, 'plugin_', clip.name, '.fbx'))
+    results['FBXExport'] = time.time() - startTime
+
+    print("{0} joints x {1} frames: sample getAttr {2:.2f}s, time context {3:.2f}s (max difference {4:.2g})".format(
+        jointCount, frameCount, results['sampleGetAttr'], results['sample'], error))
+    print("{0} clips: store fbx {1:.2f}s{2}, store mtclip {3:.2f}s, FBXExport per clip {4:.2f}s".format(
+        clipCount, results['store_fbx'], "" if fbx is not None else " (no FBX SDK, FBXExport per clip)",
+        results['store_mtclip'], results['FBXExport']))
+
+    return results
+
+def getMayapy():
+
+    # mayapy sits next to the running Maya executable
+    folder = os.path.dirname(sys.executable)
+    for name in ('mayapy.exe', 'mayapy'):
+        if os.path.isfile(os.path.join(folder, name)):
+            return os.path.join(folder, name)
+
+    return 'mayapy'
+
+def splitClips(clips, workers):
+
+    # Round-robin, so every worker gets a similar mix of long and short clips
+    chunks = [clips[index::workers] for index in range(min(workers, len(clips)))]
+    return [chunk for chunk in chunks if chunk]
+
+def reportProgress(**progress):
+
+    sys.stdout.write(progressTag + json.dumps(progress) + '\n')
+    sys.stdout.flush()
+
+def runExportJob(job):
+
+    # Exports one worker's share of the clips from a scene snapshot. job holds
+    # scene, root, clips (Clips as lists), folder, prefix, format and
+    # optionally settings and force. The manifest is only read here; the
+    # hashes go back with the progress lines and the caller saves them once
+    # every worker is done.
+    cmds.file(job['scene'], open=True, force=True)
+    if not cmds.pluginInfo('fbxmaya', q=True, loaded=True):
+        cmds.loadPlugin('fbxmaya')
+
+    clips = [toClip(clip) for clip in job['clips']]
+    ensureFolder(job['folder'])
+    store = ClipSampleStore(job['root'], [(clip.start, clip.end) for clip in clips]).sample()
+    manifest = loadExportManifest(job['folder'])
+
+    for clip in clips:
+        startTime = time.time()
+        try:
+            filePath, clipHash, changed = exportClip(store, clip, job['folder'], job.get('prefix', ''),
+                                                     job.get('format', 'fbx'), job.get('settings'), manifest,
+                                                     job.get('force', False))
+            reportProgress(clip=clip.name, status='ok' if changed else 'skipped', file=filePath, hash=clipHash,
+                           elapsed=time.time() - startTime)
+        except Exception as error:
+            reportProgress(clip=clip.name, status='error', error="%s: %s" % (type(error).__name__, error),
+                           elapsed=time.time() - startTime)
+
+def workerMain(jobPath):
+
+    import maya.standalone
+    maya.standalone.initialize()
+
+    try:
+        with open(jobPath) as jobFile:
+            runExportJob(json.load(jobFile))
+    finally:
+        maya.standalone.uninitialize()
+
+def loadSceneManifest(path):
+
+    scenes = MayapyBatch.loadManifest(path, 'scenes')
+
+    # Clip list files are relative to the manifest
+    folder = os.path.dirname(os.path.abspath(path))
+    for scene in scenes:
+        if not isinstance(scene['clips'], list):
+            scene['clips'] = [list(clip) for clip in loadClipList(os.path.join(folder, scene['clips']))]
+
+    return scenes
+
+def runScene(scene):
+
+    # Worker side: every step of the exporter dialog on one scene, in the
+    # same order, inside a standalone mayapy session
+    # References stay unloaded on open when they are going to be filtered;
+    # only the ones holding the root are loaded, then imported
+    timings = {}
+    deferReferences = scene.get('import_references', True) and scene.get('filter_references', True)
+    timed(timings, 'open', cmds.file, scene['scene'], open=True, force=True,
+          loadReferenceDepth='none' if deferReferences else 'all')
+    if not cmds.pluginInfo('fbxmaya', q=True, loaded=True):
+        cmds.loadPlugin('fbxmaya')
+
+    root = scene['root']
+    planeBone = scene.get('plane_bone')
+    clips = [toClip(clip) for clip in scene['clips']]
+    timeline = (int(cmds.playbackOptions(q=True, min=True)), int(cmds.playbackOptions(q=True, max=True)))
+
+    prepare = prepareScene(root, mergeRanges((clip.start, clip.end) for clip in clips) or [timeline], planeBone,
+                           scene.get('import_references', True),
+                           scene.get('delete_namespaces', True), scene.get('bake', True),
+                           scene.get('delete_constraints', True), scene.get('remove_namespaces', True),
+                           scene.get('filter_references', True))
+    for step, result in prepare.items():
+        timings[step] = result['elapsed']
+    counts = dict((step, result['count']) for step, result in prepare.items())
+    root = resolveNode(root)
+
+    if scene.get('set_offset_scale', True):
+        timed(timings, 'setOffsetAndScale', setOffsetAndScale, root, scene.get('offset', (0, 0, 0)),
+              scene.get('scale', (1, 1, 1)), timeline)
+
+    exportFormat = scene.get('format', 'fbx')
+    prefix = scene.get('prefix', '')
+    if exportFormat == 'mtclip' or scene.get('multiple_files', True):
+        settings = getExportSettings(root, planeBone, scene.get('offset', (0, 0, 0)), scene.get('scale', (1, 1, 1)),
+                                     exportFormat, prefix)
+        written, skipped = timed(timings, 'export', exportClipsFromStore, root, clips, scene['folder'], prefix,
+                                 exportFormat, settings, scene.get('force', False))
+    else:
+        filePath = getClipPath(scene['folder'], '', scene.get('file_name') or scene['name'], '.fbx')
+        timed(timings, 'export', exportTakesFbxPlugin, root, clips, filePath)
+        written, skipped = [filePath], []
+
+    return {'timings': timings, 'counts': counts, 'written': written, 'skipped': skipped}
+
+def runBatch(scenes, workers=None, mayapy='mayapy', timeout=None, retries=1, logDir=None):
+
+    # Scenes go to the workers as job files; with clip tables expanded from
+    # CSV/JSON they are far too long for a command line
+    return MayapyBatch.runBatch(scenes, __file__, '--scene-worker', 'scenes', workers, mayapy, timeout, retries, logDir)
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Export the animation clips of a manifest of scenes across parallel mayapy workers.")
+    parser.add_argument('manifest', nargs='?', help="JSON list of scenes and their clips")
+    MayapyBatch.addRunnerArguments(parser, 'scene')
+    parser.add_argument('--benchmark', type=int, nargs='*', default=None, metavar='N',
+                        help="time sampling and export on a synthetic scene: joints, frames, clips")
+    parser.add_argument('--export-worker', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--scene-worker', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.export_worker:
+        workerMain(args.export_worker)
+        return 0
+
+    if args.benchmark is not None:
+        import maya.standalone
+        maya.standalone.initialize()
+        try:
+            benchmarkExport(*args.benchmark)
+        finally:
+            maya.standalone.uninitialize()
+        return 0
+
+    if args.scene_worker:
+        MayapyBatch.workerMain(runScene, args.scene_worker, args.result)
+        return 0
+
+    if not args.manifest:
+        parser.error("a manifest is required")
+
+    summary = runBatch(loadSceneManifest(args.manifest), args.workers, args.mayapy, args.timeout, args.retries, args.log_dir)
+
+    return MayapyBatch.writeSummary(summary, args.summary)
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -5,7 +5,16 @@ import maya.OpenMaya as om
 import maya.OpenMayaUI as omui
 
 from pymel.core import *
-import maya.mel as mel
+import maya.cmds as cmds
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from functools import partial
+
+import AnimClipPipeline as pipeline
 
 
 def maya_main_window():
@@ -39,10 +48,93 @@ class FloatEdit(QtWidgets.QLineEdit):
         return float(self.text().replace(',', '.'))
 
 
+class ClipTableModel(QtCore.QAbstractTableModel):
+    
+    # The clip list as pipeline.Clip rows; the view edits name, start and end
+    
+    headers = ("Clip Name", "Start", "End")
+    
+    def __init__(self, parent=None):
+        super(ClipTableModel, self).__init__(parent)
+        self._clips = []
+        
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self._clips)
+    
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+    
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.headers[section]
+        return None
+    
+    def flags(self, index):
+        return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsEditable
+    
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        
+        clip = self._clips[index.row()]
+        if role in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole):
+            if index.column() == 0:
+                return clip.name
+            # Edited as text, so frames aren't clamped by a default spin box.
+            # The editor falls back to repr when the short form would round,
+            # since whatever it shows is written back on commit.
+            frame = clip[index.column()]
+            text = "%.10g" % frame
+            if role == QtCore.Qt.EditRole and float(text) != frame:
+                return repr(frame)
+            return text
+        if role == QtCore.Qt.TextAlignmentRole and index.column() > 0:
+            return int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+        return None
+    
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        if not index.isValid() or role != QtCore.Qt.EditRole:
+            return False
+        
+        clip = self._clips[index.row()]
+        if index.column() == 0:
+            clip = clip._replace(name=value.strip())
+        else:
+            try:
+                frame = float(str(value).replace(',', '.'))
+            except ValueError:
+                return False
+            clip = clip._replace(**{clip._fields[index.column()]: frame})
+            
+        self._clips[index.row()] = clip
+        self.dataChanged.emit(index, index)
+        return True
+    
+    def insertClips(self, row, clips):
+        clips = [pipeline.toClip(clip) for clip in clips]
+        if not clips:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), row, row + len(clips) - 1)
+        self._clips[row:row] = clips
+        self.endInsertRows()
+        
+    def removeRows(self, row, count, parent=QtCore.QModelIndex()):
+        self.beginRemoveRows(parent, row, row + count - 1)
+        del self._clips[row:row + count]
+        self.endRemoveRows()
+        return True
+    
+    def clips(self):
+        return list(self._clips)
+    
+    def setClips(self, clips):
+        self.beginResetModel()
+        self._clips = [pipeline.toClip(clip) for clip in clips]
+        self.endResetModel()
+
+
 class AnimationExporter(QtWidgets.QDialog):
 
-    clipName = ""
-    
     @classmethod
     def show_dialog(cls):
         if not cls.animExp:
@@ -68,6 +160,7 @@ class AnimationExporter(QtWidgets.QDialog):
         self.create_widgets()
         self.create_layout()
         self.create_connections()
+        self.updateBackgroundExport()
 
     def create_widgets(self):
         
@@ -112,10 +205,15 @@ class AnimationExporter(QtWidgets.QDialog):
         self.importRef_btn = QtWidgets.QPushButton("Import Reference")
         self.del_ns_chk = QtWidgets.QCheckBox("Delete Reference Namespaces")
         self.del_ns_chk.setChecked(True)
+        self.filter_refs_chk = QtWidgets.QCheckBox("Only Import References With Root Bone")
+        self.filter_refs_chk.setToolTip("Remove references whose file doesn't contain the root bone instead of importing them")
+        self.filter_refs_chk.setChecked(True)
         self.del_ns_btn = QtWidgets.QPushButton("Remove Namespaces")
         self.bakeAnim_btn = QtWidgets.QPushButton("Bake Animation")
         self.delConts_btn = QtWidgets.QPushButton("Delete Constraints")
         self.setXform_btn = QtWidgets.QPushButton("Set Offset and Scale")
+        self.prepare_btn = QtWidgets.QPushButton("Prepare Scene")
+        self.prepare_btn.setToolTip("Import references, remove namespaces, bake and delete constraints in one undoable step")
                 
         self.SavMult_radbtn = QtWidgets.QRadioButton("Save Multiple Clips")
         self.SavSngl_radbtn = QtWidgets.QRadioButton("Save Clips to Single File")
@@ -124,26 +222,31 @@ class AnimationExporter(QtWidgets.QDialog):
         self.rad_btn_grp.addButton(self.SavSngl_radbtn)
         self.rad_btn_spacer = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
         
-        self.clip_title_lbl = QtWidgets.QLabel("Clip Name")
-        self.clip_title_lbl.setAlignment(QtCore.Qt.AlignCenter)
-        self.clip_title_start_lbl = QtWidgets.QLabel("Start")
-        self.clip_title_start_lbl.setFixedWidth(35)
-        self.clip_title_end_lbl = QtWidgets.QLabel("End")
-        self.clip_title_end_lbl.setFixedWidth(35)
-        self.clip_title_spacer = QtWidgets.QSpacerItem(20, 20, QtWidgets.QSizePolicy.Fixed, QtWidgets.QSizePolicy.Minimum)
-        
-        self.clipName_le = QtWidgets.QLineEdit("Clip Name:")
-        
-        self.addRow_le = QtWidgets.QLineEdit("Add New Clip >>>")
-        self.addRow_le.setEnabled(False)                       
-        palette = QtGui.QPalette()
-        palette.setColor(QtGui.QPalette.Base,QtCore.Qt.darkGray)
-        palette.setColor(QtGui.QPalette.Text,QtCore.Qt.black)
-        self.addRow_le.setPalette(palette)
+        self.format_lbl = QtWidgets.QLabel("Format:")
+        self.format_cmb = QtWidgets.QComboBox()
+        self.format_cmb.addItem("FBX", "fbx")
+        self.format_cmb.addItem("Native Clip (.mtclip)", "mtclip")
+        
+        self.clip_model = ClipTableModel(self)
+        self.clip_view = QtWidgets.QTableView()
+        self.clip_view.setModel(self.clip_model)
+        self.clip_view.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.clip_view.setAlternatingRowColors(True)
+        self.clip_view.verticalHeader().setDefaultSectionSize(22)
+        self.clip_view.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        self.clip_view.horizontalHeader().setSectionResizeMode(1, QtWidgets.QHeaderView.ResizeToContents)
+        self.clip_view.horizontalHeader().setSectionResizeMode(2, QtWidgets.QHeaderView.ResizeToContents)
         
         self.addRow_btn = QtWidgets.QPushButton()
         self.addRow_btn.setIcon(QtGui.QIcon(":addClip.png"))
+        self.addRow_btn.setToolTip("Add a clip over the playback range")
         self.addRow_btn.setMaximumWidth(35)
+        self.delRow_btn = QtWidgets.QPushButton()
+        self.delRow_btn.setIcon(QtGui.QIcon(":deleteClip.png"))
+        self.delRow_btn.setToolTip("Remove the selected clips")
+        self.delRow_btn.setMaximumWidth(35)
+        self.importClips_btn = QtWidgets.QPushButton("Import Clip List")
+        self.exportClips_btn = QtWidgets.QPushButton("Save Clip List")
         
         self.filepath_le = QtWidgets.QLineEdit()
         self.filepath_le.setPlaceholderText("Export Path")
@@ -155,6 +258,14 @@ class AnimationExporter(QtWidgets.QDialog):
         self.filename_le = QtWidgets.QLineEdit()
 
         self.export_btn = QtWidgets.QPushButton("Export")
+        self.bg_export_chk = QtWidgets.QCheckBox("Export in Background")
+        self.bg_export_chk.setToolTip("Export each clip to its own file from a snapshot of the scene, using mayapy worker processes")
+        self.force_export_chk = QtWidgets.QCheckBox("Re-export Unchanged Clips")
+        self.force_export_chk.setToolTip("Write every clip file, even when its animation and settings match the last export")
+        
+        self.export_pb = QtWidgets.QProgressBar()
+        self.export_pb.setVisible(False)
+        self.export_status_lbl = QtWidgets.QLabel()
         
     def create_connections(self):
         
@@ -163,13 +274,18 @@ class AnimationExporter(QtWidgets.QDialog):
         self.del_ns_btn.clicked.connect(self.deleteNamespaces)
         self.bakeAnim_btn.clicked.connect(self.bakeKeys)
         self.delConts_btn.clicked.connect(self.delConstraints)
+        self.prepare_btn.clicked.connect(self.prepareScene)
         
         self.SavMult_radbtn.clicked.connect(self.saveOptionsRadioBtnToggled)
         self.SavSngl_radbtn.clicked.connect(self.saveOptionsRadioBtnToggled)
+        self.format_cmb.currentIndexChanged.connect(self.updateBackgroundExport)
 
         self.filepath_btn.clicked.connect(self.getFolderPath)
         
-        self.addRow_btn.clicked.connect(lambda: self.addClipRow(self.clip_main_layout))
+        self.addRow_btn.clicked.connect(self.addClipRow)
+        self.delRow_btn.clicked.connect(self.removeClipRows)
+        self.importClips_btn.clicked.connect(self.importClipList)
+        self.exportClips_btn.clicked.connect(self.saveClipList)
         
         self.export_btn.clicked.connect(self.startExport)
 
@@ -207,10 +323,12 @@ class AnimationExporter(QtWidgets.QDialog):
         btn_layout = QtWidgets.QVBoxLayout()
         btn_layout.addWidget(self.importRef_btn)
         btn_layout.addWidget(self.del_ns_chk)
+        btn_layout.addWidget(self.filter_refs_chk)
         btn_layout.addWidget(self.del_ns_btn)
         btn_layout.addWidget(self.bakeAnim_btn)
         btn_layout.addWidget(self.delConts_btn)
         btn_layout.addWidget(self.setXform_btn)
+        btn_layout.addWidget(self.prepare_btn)
         self.btn_grp_frm.setLayout(btn_layout)
         
         save_radio_btn_layout = QtWidgets.QHBoxLayout()
@@ -218,32 +336,24 @@ class AnimationExporter(QtWidgets.QDialog):
         save_radio_btn_layout.addWidget(self.SavSngl_radbtn)        
         self.SavSngl_radbtn.setChecked(True)
         save_radio_btn_layout.addSpacerItem(self.rad_btn_spacer)
+        save_radio_btn_layout.addWidget(self.format_lbl)
+        save_radio_btn_layout.addWidget(self.format_cmb)
         
         button_layout = QtWidgets.QHBoxLayout()
+        button_layout.addWidget(self.force_export_chk)
+        button_layout.addWidget(self.bg_export_chk)
         button_layout.addWidget(self.export_btn)            
         
-        clip_title_layout = QtWidgets.QHBoxLayout()
-        clip_title_layout.addWidget(self.clip_title_lbl)
-        clip_title_layout.addWidget(self.clip_title_start_lbl)
-        clip_title_layout.addWidget(self.clip_title_end_lbl)
-        clip_title_layout.addSpacerItem(self.clip_title_spacer)
-        
-        clip_remove_layout = QtWidgets.QHBoxLayout()
-        clip_remove_layout.addWidget(self.addRow_le)
-        clip_remove_layout.addWidget(self.addRow_btn)
-        clip_remove_layout.setAlignment(QtCore.Qt.AlignRight|QtCore.Qt.AlignTop)
-        
-        self.clip_main_layout = QtWidgets.QVBoxLayout()
-        self.clip_main_layout.addLayout(clip_remove_layout)
-             
-        new_clip_area = QtWidgets.QWidget()
-        new_clip_area.setLayout(self.clip_main_layout)
-        
-        clip_scroll_area = QtWidgets.QScrollArea()
-        clip_scroll_area.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOn)
-        clip_scroll_area.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
-        clip_scroll_area.setWidgetResizable(True)
-        clip_scroll_area.setWidget(new_clip_area)
+        progress_layout = QtWidgets.QHBoxLayout()
+        progress_layout.addWidget(self.export_pb)
+        progress_layout.addWidget(self.export_status_lbl)
+        
+        clip_btn_layout = QtWidgets.QHBoxLayout()
+        clip_btn_layout.addWidget(self.importClips_btn)
+        clip_btn_layout.addWidget(self.exportClips_btn)
+        clip_btn_layout.addStretch()
+        clip_btn_layout.addWidget(self.addRow_btn)
+        clip_btn_layout.addWidget(self.delRow_btn)
         
         filepath_layout = QtWidgets.QHBoxLayout()
         filepath_layout.addWidget(self.filepath_le)
@@ -265,46 +375,46 @@ class AnimationExporter(QtWidgets.QDialog):
         main_layout.addWidget(self.btn_grp_frm)
         
         main_layout.addLayout(save_radio_btn_layout)
-        main_layout.addLayout(clip_title_layout)
+        main_layout.addLayout(clip_btn_layout)
         
-        main_layout.addWidget(clip_scroll_area)
+        main_layout.addWidget(self.clip_view)
         
         main_layout.addLayout(filepath_layout)
         main_layout.addLayout(filename_layout)
         main_layout.addLayout(button_layout)
+        main_layout.addLayout(progress_layout)
     
-    def addClipRow(self, layout):
+    def addClipRow(self):
       
-        index = layout.count() - 1
         timeline = self.getTimelineMinMax()
-
-        self.delClip_btn = QtWidgets.QPushButton()
-        self.delClip_btn.setIcon(QtGui.QIcon(":deleteClip.png"))
-        self.clip_name_le = QtWidgets.QLineEdit()
-        self.clip_name_le.setPlaceholderText("Enter Clip Name")
-        self.start_frame_le = FloatEdit(str(timeline[0]), True, 35)
-        self.stop_frame_le = FloatEdit(str(timeline[1]), True, 35)
-        
-        clip_layout = QtWidgets.QHBoxLayout()
-        clip_layout.addWidget(self.delClip_btn)
-        clip_layout.addWidget(self.clip_name_le)
-        clip_layout.addWidget(self.start_frame_le)
-        clip_layout.addWidget(self.stop_frame_le)
-        
-        self.delClip_btn.clicked.connect(lambda: self.removeClipRow(clip_layout))
-        
-        layout.insertLayout(index, clip_layout)
-        
-    def removeClipRow(self, layout):
-        
-        if layout is not None:
-            while layout.count():
-                item = layout.takeAt(0)
-                widget = item.widget()
-                if widget is not None: 
-                    widget.setParent(None)
-                else:
-                    self.removeClipRow(item.layout())
+        row = self.clip_model.rowCount()
+        
+        self.clip_model.insertClips(row, [pipeline.Clip("", timeline[0], timeline[1])])
+        index = self.clip_model.index(row, 0)
+        self.clip_view.setCurrentIndex(index)
+        self.clip_view.edit(index)
+        
+    def removeClipRows(self):
+        
+        # Bottom up, so the remaining row numbers stay valid
+        rows = sorted(set(index.row() for index in self.clip_view.selectionModel().selectedRows()), reverse=True)
+        for row in rows:
+            self.clip_model.removeRows(row, 1)
+            
+    def importClipList(self):
+        
+        filePath = QtWidgets.QFileDialog.getOpenFileName(self, "Import Clip List", "", "Clip Lists (*.csv *.json)")[0]
+        if filePath:
+            try:
+                self.clip_model.setClips(pipeline.loadClipList(filePath))
+            except (IOError, ValueError, KeyError, TypeError) as error:
+                self.genericWarning("Could not read %s: %s" % (filePath, error))
+                
+    def saveClipList(self):
+        
+        filePath = QtWidgets.QFileDialog.getSaveFileName(self, "Save Clip List", "", "CSV (*.csv);;JSON (*.json)")[0]
+        if filePath:
+            pipeline.saveClipList(filePath, self.clip_model.clips())
     
     def checkObjExists(self, obj):
         if objExists(obj):
@@ -314,23 +424,26 @@ class AnimationExporter(QtWidgets.QDialog):
             self.genericWarning("%s not found, please set correct bone name" % obj)
             return False
     
-    def getTransformBone(self):
+    def getTransformBoneName(self):
         
+        # The typed name, whether or not the bone is in the scene yet
         if self.xform_bn_le.text() != "":
-            transformBone = self.xform_bn_le.text()
-        else:
-            transformBone = self.xform_bn_le.placeholderText()
+            return self.xform_bn_le.text()
+        return self.xform_bn_le.placeholderText()
         
-        return self.checkObjExists(transformBone)
+    def getPlaneBoneName(self):
+        
+        if self.pln_bn_le.text() != "":
+            return self.pln_bn_le.text()
+        return self.pln_bn_le.placeholderText()
+    
+    def getTransformBone(self):
+        
+        return self.checkObjExists(self.getTransformBoneName())
         
     def getPlaneBone(self):
         
-        if self.pln_bn_le.text() != "":
-            planeBone = self.pln_bn_le.text()
-        else:
-            planeBone = self.pln_bn_le.placeholderText()
-            
-        return self.checkObjExists(planeBone)
+        return self.checkObjExists(self.getPlaneBoneName())
         
     def getTimelineMinMax(self):
         
@@ -339,57 +452,62 @@ class AnimationExporter(QtWidgets.QDialog):
         
         return(minTimeline, maxTimeline)
     
-    def getFileName(self):
-        
-        if self.SavSngl_radbtn.isChecked():
-            return self.filename_le.text()
-        else:
-            return self.filename_le.text() + self.clipName
-    
-    def stringify(self, x):
-        
-        return '"%s"' % x if str(x) == x else str(x)
-    
     def saveOptionsRadioBtnToggled(self):
         if self.SavMult_radbtn.isChecked():
             self.filename_lbl.setText("File Prefix:")           
         else:
             self.filename_lbl.setText("File Name:")
+        self.updateBackgroundExport()
+            
+    def updateBackgroundExport(self):
+        
+        # Background workers write one file per clip, so a single FBX file of
+        # takes is always exported in the session
+        perClip = self.SavMult_radbtn.isChecked() or self.format_cmb.itemData(self.format_cmb.currentIndex()) == 'mtclip'
+        self.bg_export_chk.setEnabled(perClip)
             
     def importReferences(self):
-        refs = listReferences() or []
-        
-        for ref in refs:
-            if ref.isLoaded():
-                if self.del_ns_chk.isChecked():
-                    ref.importContents(removeNamespace=True)
-                else:
-                    ref.importContents()
+        
+        # The root may still sit in a namespaced or unloaded reference, so it
+        # is only looked for by name here and checked once it's imported
+        if self.filter_refs_chk.isChecked():
+            dropped = pipeline.filterReferences(self.getTransformBoneName())
+            print("Removed {0} reference(s) without the root bone: {1}".format(len(dropped), dropped))
+            
+        pipeline.importReferences(self.del_ns_chk.isChecked())
+        self.getTransformBone()
                 
     def deleteNamespaces(self):
         
-        defaults = ['UI', 'shared']
-        namespaces = (ns for ns in namespaceInfo(lon=True) if ns not in defaults)
-        
-        for ns in namespaces:
-            
-            namespace( removeNamespace = ns, mergeNamespaceWithParent = True)
+        pipeline.deleteNamespaces()
 
+    def getClips(self):
+        
+        # Clips of the table that have a name
+        return [clip for clip in self.clip_model.clips() if clip.name]
+    
+    def getBakeRanges(self):
+        
+        # Union of the clip ranges, merged where they touch or overlap.
+        # Falls back to the playback range when no clips are defined.
+        return pipeline.mergeRanges((clip.start, clip.end) for clip in self.getClips()) or [self.getTimelineMinMax()]
+    
     def bakeKeys(self):
     
         if self.getTransformBone():
         
             sel = ls( sl=True )
-            timeline = self.getTimelineMinMax()
-            bakeResults(sel[0], sm=True, hi="below", t=( timeline ))
+            startTime = time.time()
+            ranges = self.getBakeRanges()
+            
+            driven = pipeline.bakeKeys(sel[0].name(), ranges)
+                    
+            print("Baked {0} joint(s) over {1} in {2:.2f}s: {3}".format(len(driven), ranges, time.time() - startTime, driven))
         
         if self.pln_bn_chk.isChecked(): 
             if self.getPlaneBone():
                 sel = ls( sl=True )
-                attrs = "translate", "rotate"
-                
-                for attr in attrs:
-                    cutKey( sel[0], cl=True, t=":", hi="none", at=attr )
+                pipeline.clearPlaneBone(sel[0].name())
                     
                 self.getTransformBone();
             
@@ -397,35 +515,38 @@ class AnimationExporter(QtWidgets.QDialog):
         
         if self.getTransformBone():
             sel = ls( sl=True )
-
-            children = listRelatives( sel[0], c=1, ad=1 )
-            for child in children:
-                if child.type() == 'parentConstraint' \
-                        or child.type() == 'scaleConstraint':
-                    delete(child)
+            pipeline.deleteConstraints(sel[0].name())
+                    
+    def prepareScene(self):
+        
+        # The first four steps above as a single stage. The bones are passed
+        # by name: they may only exist once the references are imported.
+        planeBone = self.getPlaneBoneName() if self.pln_bn_chk.isChecked() else None
+        
+        try:
+            report = pipeline.prepareScene(self.getTransformBoneName(), self.getBakeRanges(), planeBone,
+                                           removeImportNamespaces=self.del_ns_chk.isChecked(),
+                                           filterRefs=self.filter_refs_chk.isChecked())
+        except ValueError as error:
+            self.genericWarning(str(error))
+            return
+        
+        for step in ('filterReferences', 'importReferences', 'deleteNamespaces', 'bake', 'deleteConstraints'):
+            if step not in report:
+                continue
+            print("{0}: {1} in {2:.2f}s".format(step, report[step]['count'], report[step]['elapsed']))
+            
+        self.getTransformBone()
                     
     def setOffsetAndScale(self):
         
         self.getTransformBone()
         sel = ls(sl=True)
         
-        cutKey( sel[0], cl=True, t=":", hi="none", at="translate" )
-        cutKey( sel[0], cl=True, t=":", hi="none", at="scale" )
+        offsetValue = [float(value) for value in self.getValuesFromLineEdit(self.offset_layout)]
+        scaleValue = [float(value) for value in self.getValuesFromLineEdit(self.scale_layout)]
         
-        offsetValue = map(float, self.getValuesFromLineEdit(self.offset_layout))
-        scaleValue = map(float, self.getValuesFromLineEdit(self.scale_layout)) 
-        
-        move(offsetValue[0], offsetValue[1], offsetValue[2], sel, a=True)
-        scale(sel, scaleValue)
-        
-        timeline = self.getTimelineMinMax()
-        
-        for frame in range(int(timeline[0]), int(timeline[1] + 1)):
-            
-            currentTime(frame)
-            
-            setKeyframe( sel[0], at="translate")
-            setKeyframe( sel[0], at="scale")
+        pipeline.setOffsetAndScale(sel[0].name(), offsetValue, scaleValue, self.getTimelineMinMax())
         
     def getValuesFromLineEdit(self, layout):
         
@@ -451,68 +572,186 @@ class AnimationExporter(QtWidgets.QDialog):
         else:
             return True
         
-    def createAnimClip(self, arg_string):
-        
-        mel.eval( 'FBXExportSplitAnimationIntoTakes -v ' + arg_string )  
+    def getExportSettings(self, root):
         
-    def clearCreateAnimClip(self, arg_string):
+        planeBone = self.pln_bn_le.text() or self.pln_bn_le.placeholderText()
         
-        mel.eval( 'FBXExportSplitAnimationIntoTakes -clear;' )
-        mel.eval( 'FBXExportSplitAnimationIntoTakes -v ' + arg_string )
+        return pipeline.getExportSettings(root, planeBone if self.pln_bn_chk.isChecked() else None,
+                                          self.getValuesFromLineEdit(self.offset_layout),
+                                          self.getValuesFromLineEdit(self.scale_layout),
+                                          self.format_cmb.itemData(self.format_cmb.currentIndex()),
+                                          self.filename_le.text())
             
-    def startExport(self):
+    def exportClipsFromStore(self, exportFormat='fbx'):
         
-        mel.eval( "FBXExportSplitAnimationIntoTakes -clear;" )
+        # Samples the skeleton once over all clips and writes the file of every
+        # clip whose hash changed since the last export into this folder
+        if not self.getTransformBone():
+            return
+        root = ls( sl=True )[0].name()
+        
+        if not self.checkForEmptyLineEdit(self.filepath_le):
+            self.getFolderPath()
+            
+        startTime = time.time()
+        written, skipped = pipeline.exportClipsFromStore(root, self.getClips(), self.filepath_le.text(), self.filename_le.text(),
+                                                         exportFormat, self.getExportSettings(root), self.force_export_chk.isChecked())
+        print("Exported {0} clip(s), {1} unchanged, in {2:.2f}s".format(len(written), len(skipped), time.time() - startTime))
+            
+    def startBackgroundExport(self):
         
-        layout = self.clip_main_layout
+        # Snapshots the prepared scene and hands the clip rows to a pool of
+        # mayapy processes, so the session stays usable while they export
+        if not self.getTransformBone():
+            return
+        root = ls( sl=True )[0].name()
         
-        rows = (layout.itemAt(i).layout() for i in range(layout.count() -1))
+        clips = self.getClips()
+        if not clips:
+            self.genericWarning("No clips to export")
+            return
         
-        for row in rows:
+        if not self.checkForEmptyLineEdit(self.filepath_le):
+            self.getFolderPath()
+            
+        self.export_tmp_dir = tempfile.mkdtemp(prefix="AnimClipExport_")
+        snapshot = os.path.join(self.export_tmp_dir, "snapshot.mb")
+        cmds.file(snapshot, exportAll=True, type="mayaBinary", force=True, preserveReferences=False)
+        
+        script = os.path.splitext(pipeline.__file__)[0] + ".py"
+        chunks = pipeline.splitClips(clips, max(1, QtCore.QThread.idealThreadCount()))
+        
+        self.export_processes = []
+        self.export_failures = []
+        self.export_count = 0
+        self.export_skipped = 0
+        self.export_hashes = {}
+        self.export_folder = self.filepath_le.text()
+        self.export_start_time = time.time()
+        self.export_pb.setRange(0, len(clips))
+        self.export_pb.setValue(0)
+        self.export_pb.setVisible(True)
+        self.export_status_lbl.setText("Exporting {0} clip(s) on {1} worker(s)".format(len(clips), len(chunks)))
+        self.export_btn.setEnabled(False)
+        
+        for index, chunk in enumerate(chunks):
+            jobPath = os.path.join(self.export_tmp_dir, "job{0}.json".format(index))
+            with open(jobPath, "w") as jobFile:
+                json.dump({"scene": snapshot, "root": root, "clips": chunk, "folder": self.export_folder,
+                           "prefix": self.filename_le.text(),
+                           "format": self.format_cmb.itemData(self.format_cmb.currentIndex()),
+                           "settings": self.getExportSettings(root),
+                           "force": self.force_export_chk.isChecked()}, jobFile)
             
-            clipArgs = []
+            process = QtCore.QProcess(self)
+            process.readyReadStandardOutput.connect(partial(self.readExportProgress, process))
+            process.finished.connect(partial(self.exportWorkerFinished, process))
+            process.errorOccurred.connect(partial(self.exportWorkerError, process))
+            process.setProgram(pipeline.getMayapy())
+            process.setArguments([script, "--export-worker", jobPath])
+            self.export_processes.append(process)
             
-            multipleFiles = self.SavMult_radbtn.isChecked()
+        # A worker that fails to start can report it before start() returns, so
+        # every process is listed first and the cleanup waits for the last one
+        for process in list(self.export_processes):
+            process.start()
             
-            if isinstance(row, QtWidgets.QHBoxLayout):
-                for j in range(row.count()):
-                    widget = row.itemAt(j).widget()
-                    if isinstance(widget, QtWidgets.QLineEdit):
-                        text =  widget.text()
-                        if text.isdigit():
-                            clipArgs.append(float(widget.text()))
-                        else:
-                            self.clipName = widget.text()
-                            clipArgs.append(self.clipName)
-                        
-            arg_string = " ".join(map(self.stringify, clipArgs))
+    def readExportProgress(self, process):
+        
+        while process.canReadLine():
+            line = bytes(process.readLine()).decode("utf-8", "replace").strip()
+            if not line.startswith(pipeline.progressTag.strip()):
+                continue
             
-            if (multipleFiles):
-                self.clearCreateAnimClip(arg_string)
-                self.exportAnimClipsFBX()
+            progress = json.loads(line[len(pipeline.progressTag):])
+            self.export_pb.setValue(self.export_pb.value() + 1)
+            if progress["status"] in ("ok", "skipped"):
+                self.export_hashes[os.path.basename(progress["file"])] = progress["hash"]
+            if progress["status"] == "ok":
+                self.export_count += 1
+                self.export_status_lbl.setText("Exported {0}".format(progress["clip"]))
+            elif progress["status"] == "skipped":
+                self.export_skipped += 1
+                self.export_status_lbl.setText("Unchanged {0}".format(progress["clip"]))
             else:
-                self.createAnimClip(arg_string)
-        if not (multipleFiles):
-            self.exportAnimClipsFBX()
+                self.export_failures.append("{0}: {1}".format(progress["clip"], progress["error"]))
+                self.export_status_lbl.setText("Failed {0}".format(progress["clip"]))
+                
+    def exportWorkerFinished(self, process, exitCode, exitStatus):
+        
+        self.readExportProgress(process)
+        if exitCode != 0 or exitStatus != QtCore.QProcess.NormalExit:
+            self.export_failures.append("worker exited with code {0}".format(exitCode))
             
-    def exportAnimClipsFBX(self):
+        self.exportWorkerDone(process)
         
-        mel.eval( "FBXExportAnimationOnly -v true;" )
+    def exportWorkerError(self, process, error):
         
-        mel.eval( "FBXExportDeleteOriginalTakeOnSplitAnimation -v true;")
+        # finished is not emitted for a worker that never started; crashes and
+        # other errors are still followed by finished and handled there
+        if error != QtCore.QProcess.FailedToStart:
+            return
         
-        self.getTransformBone()
+        self.export_failures.append("worker failed to start: {0}".format(process.errorString()))
+        self.exportWorkerDone(process)
+        
+    def exportWorkerDone(self, process):
+        
+        if process not in self.export_processes:
+            return
+        
+        self.export_processes.remove(process)
+        process.deleteLater()
+        if self.export_processes:
+            return
+        
+        shutil.rmtree(self.export_tmp_dir, ignore_errors=True)
+        if self.export_hashes:
+            pipeline.updateExportManifest(self.export_folder, self.export_hashes)
+            
+        self.export_btn.setEnabled(True)
+        self.export_status_lbl.setText("Exported {0} of {1} clip(s), {2} unchanged, in {3:.1f}s".format(
+            self.export_count, self.export_pb.maximum(), self.export_skipped, time.time() - self.export_start_time))
+        
+        if self.export_failures:
+            for failure in self.export_failures:
+                print("Background export: {0}".format(failure))
+            self.genericWarning("Background export finished with {0} error(s), see the Script Editor".format(len(self.export_failures)))
+            
+    def startExport(self):
+        
+        if self.bg_export_chk.isEnabled() and self.bg_export_chk.isChecked():
+            self.startBackgroundExport()
+            return
+        
+        # Native clips are always one file per clip row. One file per clip is
+        # exported incrementally; without the FBX Python SDK each changed FBX
+        # clip goes through its own FBXExport.
+        if self.format_cmb.itemData(self.format_cmb.currentIndex()) == 'mtclip':
+            self.exportClipsFromStore('mtclip')
+            return
+        
+        if self.SavMult_radbtn.isChecked():
+            self.exportClipsFromStore()
+            return
+        
+        self.exportAnimClipsFBX()
+            
+    def exportAnimClipsFBX(self):
+        
+        # Every clip as a take of one FBX file, the same call the batch mode makes
+        if not self.getTransformBone():
+            return
+        root = ls( sl=True )[0].name()
         
         if not self.checkForEmptyLineEdit(self.filepath_le):
             self.getFolderPath()
-        if self.SavSngl_radbtn.isChecked():
-            if not self.checkForEmptyLineEdit(self.filename_le):
-                self.genericWarning("Please choose file name")
-                return
-        
-        filePath = self.filepath_le.text() + "/" + self.getFileName()
+        if not self.checkForEmptyLineEdit(self.filename_le):
+            self.genericWarning("Please choose file name")
+            return
         
-        mel.eval( 'FBXExport -f "%s" -s' % filePath )
+        filePath = pipeline.getClipPath(self.filepath_le.text(), '', self.filename_le.text(), '.fbx')
+        pipeline.exportTakesFbxPlugin(root, self.getClips(), filePath)
                 
     def genericWarning(self, message):
             confirmDialog( title=message, button='Okay', defaultButton='Okay', cancelButton='Okay', dismissString='Okay', icn='warning' )
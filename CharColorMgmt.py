@@ -1,7 +1,24 @@
-import maya.standalone
-maya.standalone.initialize()
+import argparse
+import collections
+import hashlib
+import json
 import os
-import maya.cmds as cmds
+import re
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import cpu_count
+
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir
 
 path = 'D:\TestDir'
 prefix = 'male'
@@ -11,38 +28,612 @@ exclude = 'torso.00'
 
 renameMod = "_colorCorrect"
 
-males = []
-for dirpath, subdirs, files in os.walk(path):
-    males.extend(os.path.join(dirpath, mayafile) for mayafile in files if mayafile.startswith(prefix) and mayafile.endswith(suffix))
-
-for filepath in males:
-    
-    if not exclude in filepath:
-
-        cmds.file( filepath, o=True )
-
-        #Turn on color management
-        cmds.colorManagementPrefs(e=True, cme=True)
-
-        #set all normal textures to raw colorspace
-        files = cmds.ls(type='file')
-        normalTag = "norm"
-        for file in files:
-                texFileName = cmds.getAttr("%s.fileTextureName" % file)
-                fileSplit = texFileName.split(".")
-                fileName = fileSplit[0]
-                fileTypeSplit = fileName.split("_")
-                fileType = fileTypeSplit[-1]
-                
-                if fileType == normalTag:           
-                    cmds.setAttr(file + '.colorSpace', 'Raw', type='string')
-
-        #save file over itself
-
-        newFileName = filepath.rsplit(".",1)[0] + renameMod + suffix
-        
-        cmds.file(rename = newFileName)
-            
-        cmds.file(f=True, type='mayaAscii', save=True )
-    
-maya.standalone.uninitialize()
\ No newline at end of file
+# (role, file name suffix pattern, colorspace). The pattern is matched against
+# the last "_" token of the texture's file name, before any "." (so UDIM and
+# frame numbers are ignored). The first matching rule wins.
+colorSpaceRules = [
+    ('normal', r'norm|normal|nrm|nml', 'Raw'),
+    ('roughness', r'rough|roughness|rgh', 'Raw'),
+    ('displacement', r'disp|displacement|height|bump', 'Raw'),
+    ('metalness', r'metal|metallic|metalness|mtl', 'Raw'),
+    ('occlusion', r'ao|occlusion', 'Raw'),
+    ('albedo', r'albedo|diff|diffuse|basecolor|color|col', 'sRGB'),
+]
+
+# Bump whenever the colorspace logic changes, so the manifest redoes every scene
+ruleVersion = 2
+
+manifestName = ".colorCorrect_manifest.json"
+textureCacheName = ".colorCorrect_textures.json"
+
+cmds = None
+
+# Marks the worker's result lines among whatever Maya prints to stdout
+resultTag = "@@colorCorrect "
+
+createNodeRe = re.compile(br'^createNode (\S+) -n "([^"]+)"')
+ftnRe = re.compile(br'^\s*setAttr "\.ftn" -type "string" "(.*)";\s*$')
+colorSpaceRe = re.compile(br'^\s*setAttr "\.cs" -type "string" "([^"]*)";')
+cmeRe = re.compile(br'^(\s*setAttr "\.cme" )(yes|no);')
+
+def compileRules(rules):
+
+    # One regex for the whole table, each rule in its own named group so the
+    # match says which role it was
+    groups = "|".join("(?P<%s>%s)" % (role, pattern) for role, pattern, colorSpace in rules)
+
+    return re.compile(r'_(?:%s)$' % groups, re.IGNORECASE), dict((role, colorSpace) for role, pattern, colorSpace in rules)
+
+def loadRules(rulesPath=None):
+
+    rules = colorSpaceRules
+    if rulesPath:
+        with open(rulesPath) as rulesFile:
+            rules = [tuple(rule) for rule in json.load(rulesFile)]
+
+    return rules
+
+def getRuleVersion(rules):
+
+    return "%d:%s" % (ruleVersion, hashlib.sha1(json.dumps(rules).encode('utf-8')).hexdigest()[:12])
+
+def setRules(rules):
+
+    global ruleRe, colorSpaceByRole
+    ruleRe, colorSpaceByRole = compileRules(rules)
+
+setRules(colorSpaceRules)
+
+def classifyTexture(texFileName):
+
+    # Returns (role, colorspace), or (None, None) when no rule matches
+    fileName = re.split(r'[\\/]', texFileName)[-1].split(".")[0]
+    match = ruleRe.search(fileName)
+    if not match:
+        return None, None
+
+    return match.lastgroup, colorSpaceByRole[match.lastgroup]
+
+def normalizeTexturePath(texFileName, sceneDir):
+
+    # Relative texture paths are taken from the project root, the folder above
+    # the scene's "scenes" folder
+    texPath = texFileName
+    if not os.path.isabs(texPath) and not re.match(r'^[A-Za-z]:[\\/]', texPath):
+        texPath = os.path.join(os.path.dirname(sceneDir), texPath)
+
+    return os.path.normcase(os.path.normpath(texPath))
+
+class TextureCache(object):
+
+    # Texture role, colorspace and file facts keyed by normalized path. Shared
+    # by every scene a process handles and persisted between runs, so each
+    # texture is stat'ed at most once per maxAge seconds. The least recently
+    # used entries are dropped past maxEntries.
+
+    def __init__(self, maxEntries=200000, maxAge=3600):
+        self.entries = collections.OrderedDict()
+        self.maxEntries = maxEntries
+        self.maxAge = maxAge
+        self.rulesVersion = None
+        self.updated = {}
+
+    def load(self, cachePath):
+        if os.path.isfile(cachePath):
+            with open(cachePath) as cacheFile:
+                for key, entry in sorted(json.load(cacheFile).items(), key=lambda item: item[1]['checked']):
+                    self.entries[key] = entry
+        self.evict()
+
+    def save(self, cachePath):
+        tmpPath = cachePath + '.tmp'
+        with open(tmpPath, 'w') as cacheFile:
+            json.dump(self.entries, cacheFile)
+        if os.path.exists(cachePath):
+            os.remove(cachePath)
+        os.rename(tmpPath, cachePath)
+
+    def evict(self):
+        while len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+
+    def merge(self, entries):
+        for key, entry in entries.items():
+            self.entries.pop(key, None)
+            self.entries[key] = entry
+        self.evict()
+
+    def takeUpdated(self):
+        updated, self.updated = self.updated, {}
+        return updated
+
+    def lookup(self, texFileName, sceneDir):
+        key = normalizeTexturePath(texFileName, sceneDir)
+        entry = self.entries.pop(key, None)
+
+        if entry is None or entry['rules'] != self.rulesVersion or time.time() - entry['checked'] > self.maxAge:
+            role, colorSpace = classifyTexture(texFileName)
+            entry = {'role': role, 'colorSpace': colorSpace, 'rules': self.rulesVersion, 'checked': time.time()}
+
+            # UDIM and frame tokens name many files, so existence is left unknown
+            if '<' in key:
+                entry.update(exists=None, size=None, mtime=None)
+            else:
+                try:
+                    stat = os.stat(key)
+                    entry.update(exists=True, size=stat.st_size, mtime=stat.st_mtime)
+                except OSError:
+                    entry.update(exists=False, size=None, mtime=None)
+            self.updated[key] = entry
+
+        self.entries[key] = entry
+        self.evict()
+
+        return key, entry
+
+textureCache = TextureCache()
+
+def initializeMaya():
+
+    # Only started for scenes the text patcher can't handle
+    global cmds
+    if cmds is None:
+        import maya.standalone
+        maya.standalone.initialize()
+        import maya.cmds
+        cmds = maya.cmds
+
+    return cmds
+
+def patchFileNode(block, sceneDir, missing):
+
+    # Returns (patched block lines, change), or None when the node is left as is.
+    # Textures that don't exist on disk are added to missing.
+    ftnIndex = None
+    csIndex = None
+    currentColorSpace = 'sRGB'
+    for index, line in enumerate(block):
+        if ftnRe.match(line):
+            ftnIndex = index
+        else:
+            match = colorSpaceRe.match(line)
+            if match:
+                csIndex = index
+                currentColorSpace = match.group(1).decode('utf-8', 'replace')
+
+    if ftnIndex is None:
+        return None
+
+    texFileName = ftnRe.match(block[ftnIndex]).group(1).decode('utf-8', 'replace')
+    texFileName = re.sub(r'\\(.)', r'\1', texFileName)
+    texKey, texture = textureCache.lookup(texFileName, sceneDir)
+    if texture['exists'] is False:
+        missing.append(texKey)
+
+    role, colorSpace = texture['role'], texture['colorSpace']
+    if colorSpace is None or colorSpace == currentColorSpace:
+        return None
+
+    ftnLine = block[ftnIndex]
+    newline = ftnLine[len(ftnLine.rstrip(b'\r\n')):]
+    indent = ftnLine[:len(ftnLine) - len(ftnLine.lstrip())]
+    csLine = indent + b'setAttr ".cs" -type "string" "' + colorSpace.encode('utf-8') + b'";' + newline
+
+    patched = list(block)
+    if csIndex is None:
+        patched.insert(ftnIndex + 1, csLine)
+    else:
+        patched[csIndex] = csLine
+
+    return patched, {'texture': texFileName, 'role': role, 'from': currentColorSpace, 'to': colorSpace}
+
+def patchMayaAscii(filepath, newFileName, dryRun=False):
+
+    # Streams the .ma once, turning on color management and setting each file
+    # node's colorspace from the rule table. Only the current node block is
+    # held in memory. Returns the changes, or None if the scene needs the
+    # Maya fallback (references, multi-line texture names, no color globals).
+    # A dry run reports the changes without writing anything.
+    changed = []
+    missing = []
+    sceneDir = os.path.dirname(os.path.abspath(filepath))
+    block = None
+    blockName = None
+    inColorGlobals = False
+    sawColorGlobals = False
+    tmpFileName = os.devnull if dryRun else newFileName + '.tmp'
+
+    def flush(out):
+        patched = patchFileNode(block, sceneDir, missing)
+        if patched is None:
+            out.writelines(block)
+        else:
+            out.writelines(patched[0])
+            patched[1]['node'] = blockName.decode('utf-8', 'replace')
+            changed.append(patched[1])
+
+    try:
+        with open(filepath, 'rb') as src:
+            with open(tmpFileName, 'wb') as out:
+                for line in src:
+
+                    topLevel = line[:1] not in (b'\t', b' ', b'\r', b'\n')
+
+                    if topLevel:
+                        if block is not None:
+                            flush(out)
+                            block = None
+                        inColorGlobals = False
+
+                        if line.startswith(b'file -r'):
+                            return None
+
+                        match = createNodeRe.match(line)
+                        if match and match.group(1) == b'file':
+                            block = [line]
+                            blockName = match.group(2)
+                            continue
+
+                        if line.startswith(b'select -ne :defaultColorMgtGlobals;'):
+                            inColorGlobals = sawColorGlobals = True
+
+                    elif block is not None:
+                        if b'".ftn"' in line and not ftnRe.match(line):
+                            return None
+                        block.append(line)
+                        continue
+
+                    elif inColorGlobals:
+                        line = cmeRe.sub(br'\1yes;', line)
+
+                    out.write(line)
+
+                if block is not None:
+                    flush(out)
+
+        if not sawColorGlobals:
+            return None
+
+        if dryRun:
+            return changed, missing
+
+        if os.path.exists(newFileName):
+            os.remove(newFileName)
+        os.rename(tmpFileName, newFileName)
+
+        return changed, missing
+
+    finally:
+        if not dryRun and os.path.exists(tmpFileName):
+            os.remove(tmpFileName)
+
+def processSceneInMaya(filepath, newFileName, dryRun=False):
+
+    initializeMaya()
+    import maya.api.OpenMaya as om
+
+    # Workers are long-lived: a scene left modified by a dry run or a failure
+    # must not block the next open with unsaved changes
+    cmds.file( filepath, open=True, force=True )
+
+    #read every texture name and colorspace in one pass over the file nodes
+    changed = []
+    missing = []
+    sceneDir = os.path.dirname(os.path.abspath(filepath))
+    plugsByColorSpace = {}
+    nodes = om.MItDependencyNodes(om.MFn.kFileTexture)
+    while not nodes.isDone():
+        fileFn = om.MFnDependencyNode(nodes.thisNode())
+        texFileName = fileFn.findPlug('fileTextureName', False).asString()
+        colorSpacePlug = fileFn.findPlug('colorSpace', False)
+
+        texKey, texture = textureCache.lookup(texFileName, sceneDir)
+        if texture['exists'] is False:
+            missing.append(texKey)
+
+        role, colorSpace = texture['role'], texture['colorSpace']
+        if colorSpace is not None and colorSpace != colorSpacePlug.asString():
+            plugsByColorSpace.setdefault(colorSpace, []).append(colorSpacePlug)
+            changed.append({'node': fileFn.name(), 'texture': texFileName, 'role': role,
+                            'from': colorSpacePlug.asString(), 'to': colorSpace})
+        nodes.next()
+
+    if dryRun:
+        return changed, missing
+
+    #Turn on color management
+    cmds.colorManagementPrefs(e=True, cme=True)
+
+    #apply every change as one batch, grouped by target colorspace
+    modifier = om.MDGModifier()
+    for colorSpace, plugs in plugsByColorSpace.items():
+        for plug in plugs:
+            modifier.newPlugValueString(plug, colorSpace)
+    modifier.doIt()
+
+    #save file over itself
+
+    cmds.file(rename = newFileName)
+
+    cmds.file(f=True, type='mayaAscii', save=True )
+
+    return changed, missing
+
+def getOutputPath(filepath):
+
+    return filepath.rsplit(".",1)[0] + renameMod + suffix
+
+def processScene(filepath, dryRun=False):
+
+    newFileName = getOutputPath(filepath)
+
+    result = patchMayaAscii(filepath, newFileName, dryRun)
+    if result is not None:
+        return result + ('text',)
+
+    return processSceneInMaya(filepath, newFileName, dryRun) + ('maya',)
+
+def discoverScenes(path, prefix, suffix, exclude):
+
+    # Returns (path, size, mtime) for every matching scene. Names are filtered
+    # before anything is stat'ed, hidden and excluded folders are never
+    # entered, and our own _colorCorrect copies are left out.
+    males = []
+    folders = [path]
+    while folders:
+        try:
+            entries = list(scandir(folders.pop()))
+        except OSError:
+            continue
+
+        for entry in entries:
+            if exclude in entry.path:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                if not entry.name.startswith('.'):
+                    folders.append(entry.path)
+            elif entry.name.startswith(prefix) and entry.name.endswith(suffix) and not entry.name.endswith(renameMod + suffix):
+                stat = entry.stat()
+                males.append((entry.path, stat.st_size, stat.st_mtime))
+
+    return sorted(males)
+
+def hashFile(filepath):
+
+    digest = hashlib.sha1()
+    with open(filepath, 'rb') as sceneFile:
+        for chunk in iter(lambda: sceneFile.read(1 << 20), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def loadManifest(manifestPath):
+
+    if not os.path.isfile(manifestPath):
+        return {}
+
+    with open(manifestPath) as manifestFile:
+        return json.load(manifestFile)
+
+def saveManifest(manifestPath, manifest):
+
+    tmpPath = manifestPath + '.tmp'
+    with open(tmpPath, 'w') as manifestFile:
+        json.dump(manifest, manifestFile, indent=1, sort_keys=True)
+
+    if os.path.exists(manifestPath):
+        os.remove(manifestPath)
+    os.rename(tmpPath, manifestPath)
+
+def selectScenes(scenes, manifest, rulesVersion, force=False):
+
+    # Splits discovered scenes into those to process and those already done
+    # under the current rules. Only scenes that would otherwise be skipped but
+    # whose size or mtime moved are hashed here, so a touched but identical
+    # file is just re-stamped; the workers hash everything they process.
+    todo = []
+    skipped = []
+    for filepath, size, mtime in scenes:
+        entry = manifest.get(filepath)
+        upToDate = (not force and entry is not None and entry.get('rules') == rulesVersion
+                    and os.path.exists(getOutputPath(filepath)))
+
+        if upToDate and entry['size'] == size and entry['mtime'] == mtime:
+            skipped.append(filepath)
+            continue
+
+        digest = hashFile(filepath) if upToDate else None
+        if upToDate and entry['hash'] == digest:
+            entry['size'] = size
+            entry['mtime'] = mtime
+            skipped.append(filepath)
+            continue
+
+        todo.append((filepath, {'size': size, 'mtime': mtime, 'hash': digest, 'rules': rulesVersion}))
+
+    return todo, skipped
+
+def workerMain(dryRun=False):
+
+    # Reads one JSON-encoded scene path per line from stdin and answers with
+    # one tagged JSON result line, so the parent can keep feeding this process
+    for line in iter(sys.stdin.readline, ''):
+        if not line.strip():
+            continue
+
+        filepath = json.loads(line)
+        result = {'file': filepath}
+        startTime = time.time()
+        try:
+            # The manifest hash is taken here, in parallel; a dry run never
+            # records one
+            if not dryRun:
+                result['hash'] = hashFile(filepath)
+            result['changed'], result['missing'], result['method'] = processScene(filepath, dryRun)
+        except Exception as error:
+            result['error'] = "%s: %s" % (type(error).__name__, error)
+        result['elapsed'] = time.time() - startTime
+
+        # Freshly stat'ed textures go back to the parent, which owns the cache file
+        result['textures'] = textureCache.takeUpdated()
+
+        sys.stdout.write(resultTag + json.dumps(result) + '\n')
+        sys.stdout.flush()
+
+    if cmds is not None:
+        import maya.standalone
+        maya.standalone.uninitialize()
+
+def startWorker(mayapy, workerArgs):
+
+    return subprocess.Popen([mayapy, os.path.abspath(__file__), '--worker'] + workerArgs,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+def runBatch(scenes, workers=None, mayapy='mayapy', logPath=None, callback=None, workerArgs=()):
+
+    # Every worker thread owns one mayapy process and pulls scenes from a shared
+    # queue. If the process dies, only the scene it was on is recorded as failed
+    # and a fresh process picks up the rest.
+    pending = Queue()
+    for filepath in scenes:
+        pending.put(filepath)
+
+    lock = threading.Lock()
+    results = []
+    logFile = open(logPath, 'a') if logPath else None
+
+    def record(result):
+        with lock:
+            textureCache.merge(result.pop('textures', {}))
+            results.append(result)
+            if logFile:
+                logFile.write(json.dumps(result) + '\n')
+                logFile.flush()
+            if callback:
+                callback(result)
+
+    def drive():
+        process = None
+        while True:
+            try:
+                filepath = pending.get_nowait()
+            except Empty:
+                break
+
+            if process is None:
+                process = startWorker(mayapy, list(workerArgs))
+
+            startTime = time.time()
+            result = None
+            try:
+                process.stdin.write((json.dumps(filepath) + '\n').encode('utf-8'))
+                process.stdin.flush()
+                for line in iter(process.stdout.readline, b''):
+                    line = line.decode('utf-8', 'replace')
+                    if line.startswith(resultTag):
+                        result = json.loads(line[len(resultTag):])
+                        break
+            except (IOError, OSError):
+                pass
+
+            if result is None:
+                process.kill()
+                process.wait()
+                result = {'file': filepath, 'error': "worker crashed (exit code %s)" % process.returncode,
+                          'elapsed': time.time() - startTime}
+                process = None
+
+            record(result)
+
+        if process is not None:
+            process.stdin.close()
+            process.wait()
+
+    threads = [threading.Thread(target=drive) for each in range(min(workers or cpu_count(), len(scenes)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if logFile:
+        logFile.close()
+
+    return results
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Set normal map file nodes to Raw colorspace across a scene library.")
+    parser.add_argument('path', nargs='?', default=path, help="root folder to search for scenes")
+    parser.add_argument('--prefix', default=prefix)
+    parser.add_argument('--suffix', default=suffix)
+    parser.add_argument('--exclude', default=exclude, help="skip scenes whose path contains this")
+    parser.add_argument('--workers', type=int, default=None, help="parallel worker processes (default: all cores)")
+    parser.add_argument('--mayapy', default='mayapy', help="interpreter used for the workers")
+    parser.add_argument('--log', default=None, help="JSONL file that receives one result per scene")
+    parser.add_argument('--manifest', default=None, help="JSON record of processed scenes (default: %s in path)" % manifestName)
+    parser.add_argument('--force', action='store_true', help="reprocess every scene, ignoring the manifest")
+    parser.add_argument('--rules', default=None, help="JSON list of [role, pattern, colorspace] replacing the built-in table")
+    parser.add_argument('--dry-run', action='store_true', help="report the colorspace changes without writing any scene")
+    parser.add_argument('--texture-cache', default=None, help="JSON texture metadata cache (default: %s in path)" % textureCacheName)
+    parser.add_argument('--texture-max-age', type=float, default=3600, help="seconds before a cached texture is stat'ed again")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    rules = loadRules(args.rules)
+    setRules(rules)
+
+    textureCachePath = args.texture_cache or os.path.join(args.path, textureCacheName)
+    textureCache.rulesVersion = getRuleVersion(rules)
+    textureCache.maxAge = args.texture_max_age
+    textureCache.load(textureCachePath)
+
+    if args.worker:
+        workerMain(args.dry_run)
+        return 0
+
+    startTime = time.time()
+    manifestPath = args.manifest or os.path.join(args.path, manifestName)
+    manifest = loadManifest(manifestPath)
+
+    # A dry run reports on every scene and never touches the manifest
+    scenes, skipped = selectScenes(discoverScenes(args.path, args.prefix, args.suffix, args.exclude), manifest,
+                                   getRuleVersion(rules), args.force or args.dry_run)
+    entries = dict(scenes)
+
+    workerArgs = ['--texture-cache', os.path.abspath(textureCachePath), '--texture-max-age', str(args.texture_max_age)]
+    if args.rules:
+        workerArgs += ['--rules', os.path.abspath(args.rules)]
+    if args.dry_run:
+        workerArgs.append('--dry-run')
+
+    def report(result):
+        if 'error' in result:
+            print("FAILED %s: %s" % (result['file'], result['error']))
+        else:
+            print("%s: %d change(s) (%s, %.2fs)" % (result['file'], len(result['changed']), result['method'], result['elapsed']))
+            for change in result['changed']:
+                print("    %s  %s -> %s  (%s, %s)" % (change['node'], change['from'], change['to'], change['role'], change['texture']))
+            for texture in result['missing']:
+                print("    missing texture: %s" % texture)
+
+    results = runBatch(sorted(entries), args.workers, args.mayapy, args.log, report, workerArgs)
+    failed = sum(1 for result in results if 'error' in result)
+
+    if not args.dry_run:
+        for result in results:
+            if 'error' not in result:
+                entry = entries[result['file']]
+                entry['hash'] = result['hash']
+                manifest[result['file']] = entry
+        saveManifest(manifestPath, manifest)
+
+    textureCache.save(textureCachePath)
+
+    print("%d scenes, %d skipped, %d failed, %.1fs" % (len(results), len(skipped), failed, time.time() - startTime))
+
+    return 0 if not failed else 1
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
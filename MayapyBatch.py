@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import tempfile
+import time
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+
+###Process-pool runner shared by the headless CLIs (TransferAnimBatch and
+###AnimClipPipeline). Every job runs in its own mayapy process per attempt:
+###    mayapy <script> <workerFlag> <job.json> --result <result.json>
+###The job is handed over as a JSON file, so large jobs never hit the command
+###line length limit, and the worker writes a JSON dict that is merged into
+###the job's report. Nothing here imports maya, so the runner side works from
+###any Python.
+
+
+def loadManifest(path, key):
+
+    with open(path) as manifestFile:
+        manifest = json.load(manifestFile)
+
+    jobs = manifest[key] if isinstance(manifest, dict) else manifest
+
+    for index, job in enumerate(jobs):
+        job.setdefault('name', os.path.splitext(os.path.basename(job['scene']))[0] or str(index))
+
+    return jobs
+
+def timed(timings, step, func, *args, **kwargs):
+
+    startTime = time.time()
+    result = func(*args, **kwargs)
+    timings[step] = time.time() - startTime
+
+    return result
+
+def workerMain(run, jobPath, resultPath):
+
+    # Worker side: run(job) is called inside a standalone mayapy session and
+    # must return a JSON-serializable dict
+    import maya.standalone
+    maya.standalone.initialize()
+
+    try:
+        with open(jobPath) as jobFile:
+            result = run(json.load(jobFile))
+        with open(resultPath, 'w') as resultFile:
+            json.dump(result, resultFile)
+    finally:
+        maya.standalone.uninitialize()
+
+def runJobProcess(index, job, script, workerFlag, mayapy, timeout, retries, logDir):
+
+    # Runner side: one mayapy process per attempt, so a crash or a hang only
+    # costs that job, and is retried up to `retries` times
+    report = {'name': job['name'], 'status': 'failed', 'attempts': 0, 'timings': {}}
+    startTime = time.time()
+
+    # Names usually come from scene basenames, so prefix the manifest index to
+    # keep a/shot.ma and b/shot.ma from sharing jobs, logs and results
+    fileName = "%03d_%s" % (index, re.sub(r'[^\w.-]', '_', job['name']))
+    jobPath = os.path.join(logDir, fileName + ".job.json")
+    with open(jobPath, 'w') as jobFile:
+        json.dump(job, jobFile)
+
+    for attempt in range(retries + 1):
+
+        report['attempts'] = attempt + 1
+        resultPath = os.path.join(logDir, "%s.%d.json" % (fileName, attempt))
+        logPath = os.path.join(logDir, "%s.%d.log" % (fileName, attempt))
+        command = [mayapy, script, workerFlag, jobPath, '--result', resultPath]
+
+        # Maya logs a lot; writing to a file avoids filling a pipe while polling
+        timedOut = False
+        with open(logPath, 'w') as logFile:
+            process = subprocess.Popen(command, stdout=logFile, stderr=subprocess.STDOUT)
+            attemptStart = time.time()
+            while process.poll() is None:
+                if timeout and time.time() - attemptStart > timeout:
+                    process.kill()
+                    process.wait()
+                    timedOut = True
+                    break
+                time.sleep(0.5)
+
+        report['log'] = logPath
+
+        if process.returncode == 0 and os.path.isfile(resultPath):
+            with open(resultPath) as resultFile:
+                report.update(json.load(resultFile))
+            report['status'] = 'ok'
+            report.pop('error', None)
+            break
+
+        if timedOut:
+            report['error'] = "timed out after %ss" % timeout
+        else:
+            report['error'] = "exit code %s" % process.returncode
+
+    report['elapsed'] = time.time() - startTime
+    print("[{0}] {1} in {2:.1f}s ({3} attempt(s))".format(report['status'], job['name'], report['elapsed'], report['attempts']))
+
+    return report
+
+def runBatch(jobs, script, workerFlag, key='jobs', workers=None, mayapy='mayapy', timeout=None, retries=1, logDir=None):
+
+    if logDir is None:
+        logDir = tempfile.mkdtemp(prefix=os.path.splitext(os.path.basename(script))[0] + '_')
+    if not os.path.isdir(logDir):
+        os.makedirs(logDir)
+
+    script = os.path.abspath(script)
+    startTime = time.time()
+    pool = ThreadPool(workers or cpu_count())
+    try:
+        reports = pool.map(lambda item: runJobProcess(item[0], item[1], script, workerFlag, mayapy, timeout, retries, logDir),
+                           list(enumerate(jobs)))
+    finally:
+        pool.close()
+        pool.join()
+
+    # Per-stage totals over every job that went through
+    stages = {}
+    for report in reports:
+        for stage, elapsed in report['timings'].items():
+            stages[stage] = stages.get(stage, 0.0) + elapsed
+
+    return {
+        'elapsed': time.time() - startTime,
+        'succeeded': sum(1 for report in reports if report['status'] == 'ok'),
+        'failed': sum(1 for report in reports if report['status'] != 'ok'),
+        'stages': stages,
+        key: reports,
+    }
+
+def addRunnerArguments(parser, item):
+
+    parser.add_argument('--workers', type=int, default=None, help="parallel mayapy processes (default: all cores)")
+    parser.add_argument('--timeout', type=float, default=None, help="seconds before a %s attempt is killed" % item)
+    parser.add_argument('--retries', type=int, default=1, help="extra attempts after a crash or timeout")
+    parser.add_argument('--mayapy', default='mayapy', help="interpreter used for the workers")
+    parser.add_argument('--log-dir', default=None, help="folder for job files and per-attempt worker logs")
+    parser.add_argument('--summary', default=None, help="write the JSON timing summary here")
+    parser.add_argument('--result', default=None, help=argparse.SUPPRESS)
+
+def writeSummary(summary, path=None):
+
+    if path:
+        with open(path, 'w') as summaryFile:
+            json.dump(summary, summaryFile, indent=2)
+    else:
+        print(json.dumps(summary, indent=2))
+
+    return 0 if not summary['failed'] else 1
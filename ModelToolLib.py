@@ -7,16 +7,338 @@ import maya.OpenMayaUI as omui
 import maya.OpenMaya as om
 
 import maya.cmds as cmds
+import hashlib
 import os
+import sys
+import time
 
 ###Tested in MAYA 2019 only.
 
+THUMBNAIL_SIZE = 120
+THUMBNAIL_FOLDER = ".thumbnails"
+# In-memory thumbnail budget, in KB (a 120px thumbnail is about 56 KB)
+PIXMAP_CACHE_LIMIT = 64 * 1024
+# Most thumbnails decoded by one pool task
+THUMBNAIL_TASK_SIZE = 16
+
 def maya_main_window():
 
     main_window_ptr = omui.MQtUtil.mainWindow()
+    if not main_window_ptr:
+        # mayapy / offscreen: no Maya window to parent to
+        return None
     return wrapInstance(long(main_window_ptr), QtWidgets.QWidget)
 
 
+def crop_rect(width, height):
+    # Centered square of an image
+    if height > width:
+        return QtCore.QRect(0, (height - width) // 2, width, width)
+    return QtCore.QRect((width - height) // 2, 0, height, height)
+
+
+class ThumbnailCache(object):
+    # Cell-sized, center-cropped thumbnails of the library snapshots, kept on
+    # disk in a folder next to the images and keyed by source path + mtime,
+    # so a snapshot is only decoded at full size once. Decoded thumbnails are
+    # shared through QPixmapCache.
+
+    def __init__(self, size=THUMBNAIL_SIZE):
+        self.size = size
+        QtGui.QPixmapCache.setCacheLimit(max(QtGui.QPixmapCache.cacheLimit(), PIXMAP_CACHE_LIMIT))
+
+    def cache_key(self, src_path):
+        src_path = os.path.normpath(src_path)
+        stamp = "{0}|{1}|{2}".format(src_path, os.path.getmtime(src_path), self.size)
+        return hashlib.sha1(stamp.encode("utf-8")).hexdigest()[:16]
+
+    def cache_folder(self, src_path):
+        return os.path.join(os.path.dirname(os.path.normpath(src_path)), THUMBNAIL_FOLDER)
+
+    def thumbnail_path(self, src_path, key=None):
+        name = os.path.splitext(os.path.basename(src_path))[0]
+        return os.path.join(self.cache_folder(src_path), "{0}_{1}.jpg".format(name, key or self.cache_key(src_path)))
+
+    def load_image(self, src_path):
+        # QImage of the thumbnail, made from the source if it isn't cached yet.
+        # Only uses QImage, so it can run outside the main thread.
+        if not os.path.isfile(src_path):
+            return QtGui.QImage()
+
+        thumb_path = self.thumbnail_path(src_path)
+        if os.path.isfile(thumb_path):
+            image = QtGui.QImage(thumb_path)
+            if not image.isNull():
+                return image
+
+        # The JPEG reader crops and scales while decoding
+        reader = QtGui.QImageReader(src_path)
+        src_size = reader.size()
+        if src_size.isValid():
+            reader.setClipRect(crop_rect(src_size.width(), src_size.height()))
+            reader.setScaledSize(QtCore.QSize(self.size, self.size))
+        image = reader.read()
+        if image.isNull():
+            return image
+
+        self.store(src_path, thumb_path, image)
+        return image
+
+    def store(self, src_path, thumb_path, image):
+        cache_path = self.cache_folder(src_path)
+        if not os.path.isdir(cache_path):
+            try:
+                os.makedirs(cache_path)
+            except OSError:
+                pass
+
+        # A small per-snapshot file remembers the key of its current thumbnail,
+        # so the one stale version is removed without listing the folder
+        name = os.path.splitext(os.path.basename(src_path))[0]
+        key_path = os.path.join(cache_path, name + ".key")
+        try:
+            with open(key_path) as key_file:
+                stale_path = self.thumbnail_path(src_path, key_file.read().strip())
+        except (IOError, OSError):
+            stale_path = None
+        if stale_path and stale_path != thumb_path:
+            try:
+                os.remove(stale_path)
+            except OSError:
+                pass
+
+        image.save(thumb_path, "JPG", 90)
+        key = os.path.basename(thumb_path)[len(name) + 1:-len(".jpg")]
+        try:
+            with open(key_path, "w") as key_file:
+                key_file.write(key)
+        except (IOError, OSError):
+            pass
+
+    def find(self, key):
+        # Pixmap already in QPixmapCache under key, or None
+        pixmap = QtGui.QPixmap()
+        if key and QtGui.QPixmapCache.find(key, pixmap):
+            return pixmap
+        return None
+
+    def pixmap(self, src_path, image=None):
+        if not os.path.isfile(src_path):
+            return QtGui.QPixmap()
+
+        key = self.cache_key(src_path)
+        pixmap = QtGui.QPixmap()
+        if QtGui.QPixmapCache.find(key, pixmap):
+            return pixmap
+
+        pixmap = QtGui.QPixmap.fromImage(image if image is not None else self.load_image(src_path))
+        if not pixmap.isNull():
+            QtGui.QPixmapCache.insert(key, pixmap)
+        return pixmap
+
+
+class LibraryLoadJob(object):
+    # One library load; tasks check `cancelled` between files
+
+    def __init__(self, folder, img_path):
+        self.folder = folder
+        self.img_path = img_path
+        self.cancelled = False
+
+
+class LibraryLoadSignals(QtCore.QObject):
+    # Emitted from the pool threads, delivered on the main thread
+    files_found = QtCore.Signal(object, object)
+    thumbnail_loaded = QtCore.Signal(object, object, object)
+
+
+class LibraryScanTask(QtCore.QRunnable):
+    # Lists the .obj files of the library folder, and whether each one has a
+    # snapshot in the images folder
+
+    def __init__(self, job, signals):
+        super(LibraryScanTask, self).__init__()
+        self.job = job
+        self.signals = signals
+
+    def run(self):
+        try:
+            files = os.listdir(self.job.folder)
+        except OSError:
+            files = []
+        names = sorted(os.path.splitext(f)[0] for f in files if f.lower().endswith(".obj"))
+        found = [(name, os.path.isfile(os.path.join(self.job.img_path, name + ".jpg"))) for name in names]
+        if not self.job.cancelled:
+            self.signals.files_found.emit(self.job, found)
+
+
+class ThumbnailTask(QtCore.QRunnable):
+    # Decodes a few (filename, snapshot) thumbnails to QImage; a null image
+    # means the snapshot couldn't be read
+
+    def __init__(self, job, items, thumbnails, signals):
+        super(ThumbnailTask, self).__init__()
+        self.job = job
+        self.items = items
+        self.thumbnails = thumbnails
+        self.signals = signals
+
+    def run(self):
+        for filename, img_path in self.items:
+            if self.job.cancelled:
+                return
+            self.signals.thumbnail_loaded.emit(self.job, filename, self.thumbnails.load_image(img_path))
+
+
+class LibraryModel(QtCore.QAbstractListModel):
+    # The library objects of the icon view, one row each. Thumbnails are
+    # only decoded when the view asks for an item it is about to paint and
+    # are kept in QPixmapCache, not in the model, so memory stays flat with
+    # the size of the library.
+
+    FILE_PATH_ROLE = QtCore.Qt.UserRole
+    HAS_IMAGE_ROLE = QtCore.Qt.UserRole + 1
+
+    def __init__(self, thumbnails, parent=None):
+        super(LibraryModel, self).__init__(parent)
+        self.thumbnails = thumbnails
+
+        # [filename, snapshot path or None, QPixmapCache key or None]
+        self.entries = []
+        # filename -> row
+        self.rows = {}
+
+        self.thread_pool = QtCore.QThreadPool.globalInstance()
+        self.job = LibraryLoadJob(None, None)
+        self.requested = set()
+        self.request_queue = []
+        self.signals = LibraryLoadSignals(self)
+        self.signals.thumbnail_loaded.connect(self.thumbnail_loaded)
+        self.request_timer = QtCore.QTimer(self)
+        self.request_timer.setSingleShot(True)
+        self.request_timer.setInterval(0)
+        self.request_timer.timeout.connect(self.dispatch_requests)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        filename, img_path, key = self.entries[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            return os.path.splitext(os.path.basename(filename))[0]
+        if role in (QtCore.Qt.ToolTipRole, self.FILE_PATH_ROLE):
+            return filename
+        if role == self.HAS_IMAGE_ROLE:
+            return img_path is not None
+        if role == QtCore.Qt.DecorationRole and img_path:
+            pixmap = self.thumbnails.find(key)
+            if pixmap is None:
+                self.request_thumbnail(filename, img_path)
+            return pixmap
+        return None
+
+    def row_of(self, filename):
+        return self.rows.get(filename)
+
+    def add_entry(self, filename, img_path=None, pixmap=None):
+        self.add_entries([(filename, img_path)])
+        if pixmap is not None:
+            self.set_pixmap(len(self.entries) - 1, img_path, pixmap)
+
+    def add_entries(self, items):
+        # Appends (filename, snapshot path or None) pairs as one insert
+        if not items:
+            return
+        first = len(self.entries)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(items) - 1)
+        for row, (filename, img_path) in enumerate(items, first):
+            self.entries.append([filename, img_path, None])
+            self.rows[filename] = row
+        self.endInsertRows()
+
+    def update_entry(self, row, img_path=None, pixmap=None):
+        entry = self.entries[row]
+        entry[1] = img_path
+        entry[2] = None
+        self.requested.discard(entry[0])
+        if pixmap is not None:
+            self.set_pixmap(row, img_path, pixmap)
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def set_pixmap(self, row, img_path, pixmap):
+        if pixmap.isNull():
+            return
+        key = self.thumbnails.cache_key(img_path)
+        QtGui.QPixmapCache.insert(key, pixmap)
+        self.entries[row][2] = key
+
+    def request_thumbnail(self, filename, img_path):
+        # Collected while the view paints, then handed to the pool at once
+        if filename in self.requested:
+            return
+        self.requested.add(filename)
+        self.request_queue.append((filename, img_path))
+        self.request_timer.start()
+
+    def dispatch_requests(self):
+        queue = self.request_queue
+        self.request_queue = []
+        for i in range(0, len(queue), THUMBNAIL_TASK_SIZE):
+            self.thread_pool.start(ThumbnailTask(self.job, queue[i:i + THUMBNAIL_TASK_SIZE], self.thumbnails, self.signals))
+
+    def thumbnail_loaded(self, job, filename, image):
+        row = self.rows.get(filename)
+        if job is not self.job or row is None:
+            return
+
+        self.requested.discard(filename)
+        entry = self.entries[row]
+        if image.isNull():
+            # Unreadable snapshot, shown like a missing one
+            entry[1] = None
+        else:
+            self.set_pixmap(row, entry[1], QtGui.QPixmap.fromImage(image))
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def cancel_requests(self):
+        self.job.cancelled = True
+        self.job = LibraryLoadJob(None, None)
+        self.requested.clear()
+        self.request_queue = []
+
+
+class LibraryItemDelegate(QtWidgets.QStyledItemDelegate):
+    # Paints an item's thumbnail, or its name on grey while the thumbnail
+    # loads and on red when it has no snapshot
+
+    def sizeHint(self, option, index):
+        return QtCore.QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+
+    def paint(self, painter, option, index):
+        rect = option.rect.adjusted(1, 1, -1, -1)
+        pixmap = index.data(QtCore.Qt.DecorationRole)
+
+        painter.save()
+        if pixmap is not None and not pixmap.isNull():
+            painter.drawPixmap(rect, pixmap)
+        else:
+            has_image = index.data(LibraryModel.HAS_IMAGE_ROLE)
+            painter.fillRect(rect, option.palette.mid() if has_image else QtGui.QColor("red"))
+            painter.setPen(option.palette.text().color())
+            painter.drawText(rect.adjusted(4, 4, -4, -4), QtCore.Qt.AlignCenter | QtCore.Qt.TextWrapAnywhere,
+                             index.data(QtCore.Qt.DisplayRole))
+
+        if option.state & (QtWidgets.QStyle.State_Selected | QtWidgets.QStyle.State_MouseOver):
+            painter.setPen(QtGui.QPen(option.palette.highlight().color(), 2))
+            painter.drawRect(rect.adjusted(1, 1, -1, -1))
+        painter.restore()
+
+
 class OverwriteDialog(QtWidgets.QDialog):
 
     def __init__(self, parent=maya_main_window()):
@@ -64,6 +386,13 @@ class ModelKitDialog(QtWidgets.QDialog):
         self.img_path = None
         self.cameraName = None
         self.filename = None
+        self.thumbnails = ThumbnailCache()
+
+        self.library_model = LibraryModel(self.thumbnails, self)
+
+        self.thread_pool = QtCore.QThreadPool.globalInstance()
+        self.load_job = None
+        self.load_signals = LibraryLoadSignals(self)
 
         self.setWindowTitle(self.WINDOW_TITLE)
         self.setWindowFlags(self.windowFlags() ^ QtCore.Qt.WindowContextHelpButtonHint)
@@ -74,12 +403,20 @@ class ModelKitDialog(QtWidgets.QDialog):
         self.create_connections()
 
     def create_widgets(self):
-        self.table_wdg = QtWidgets.QTableWidget()
-        self.table_wdg.setColumnCount(5)
-        for each in range(0, self.table_wdg.columnCount()):
-            self.table_wdg.setColumnWidth(each, 120)
-        self.table_wdg.setRowCount(1)
-        self.table_wdg.setRowHeight(0, 120)
+        # Icon mode with uniform items: only the visible thumbnails are
+        # painted, and the layout of a big library is done in batches
+        self.library_view = QtWidgets.QListView()
+        self.library_view.setViewMode(QtWidgets.QListView.IconMode)
+        self.library_view.setResizeMode(QtWidgets.QListView.Adjust)
+        self.library_view.setMovement(QtWidgets.QListView.Static)
+        self.library_view.setUniformItemSizes(True)
+        self.library_view.setGridSize(QtCore.QSize(THUMBNAIL_SIZE + 4, THUMBNAIL_SIZE + 4))
+        self.library_view.setLayoutMode(QtWidgets.QListView.Batched)
+        self.library_view.setBatchSize(500)
+        self.library_view.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.library_view.setMouseTracking(True)
+        self.library_view.setModel(self.library_model)
+        self.library_view.setItemDelegate(LibraryItemDelegate(self.library_view))
         
         self.libraryload_lable = QtWidgets.QLabel("Library Folder")
         self.libraryload_le = QtWidgets.QLineEdit()
@@ -87,6 +424,11 @@ class ModelKitDialog(QtWidgets.QDialog):
         self.select_lib_path_btn.setIcon(QtGui.QIcon(":fileOpen.png"))
         self.load_library_btn = QtWidgets.QPushButton("Load Existing")
 
+        self.load_progress_bar = QtWidgets.QProgressBar()
+        self.load_progress_bar.setVisible(False)
+        self.cancel_load_btn = QtWidgets.QPushButton("Cancel")
+        self.cancel_load_btn.setVisible(False)
+
         self.add_btn = QtWidgets.QPushButton("Add Object")
         self.close_btn = QtWidgets.QPushButton("Close")
 
@@ -97,6 +439,10 @@ class ModelKitDialog(QtWidgets.QDialog):
         lib_loader_layout.addWidget(self.select_lib_path_btn)
         lib_loader_layout.addWidget(self.load_library_btn)
 
+        load_progress_layout = QtWidgets.QHBoxLayout()
+        load_progress_layout.addWidget(self.load_progress_bar)
+        load_progress_layout.addWidget(self.cancel_load_btn)
+
         button_layout = QtWidgets.QHBoxLayout()
         button_layout.addSpacing(2)
         button_layout.addStretch()
@@ -107,16 +453,19 @@ class ModelKitDialog(QtWidgets.QDialog):
         main_layout.setContentsMargins(2,2,2,2)
         main_layout.addSpacing(2)
         main_layout.addLayout(lib_loader_layout)
-        main_layout.addWidget(self.table_wdg)
+        main_layout.addWidget(self.library_view)
+        main_layout.addLayout(load_progress_layout)
         main_layout.addLayout(button_layout)
 
     def create_connections(self):
         self.select_lib_path_btn.clicked.connect(self.show_folder_select_dialog)
         self.load_library_btn.clicked.connect(self.load_existing_library)
+        self.cancel_load_btn.clicked.connect(self.cancel_library_load)
+        self.load_signals.files_found.connect(self.library_files_found)
 
         self.add_btn.clicked.connect(self.export_geo)
         self.close_btn.clicked.connect(self.close)
-        self.table_wdg.cellClicked.connect(self.table_cell_clicked)
+        self.library_view.clicked.connect(self.library_item_clicked)
 
     def show_folder_select_dialog(self):
         self.launch_libfolder_sel_window()
@@ -128,34 +477,58 @@ class ModelKitDialog(QtWidgets.QDialog):
 
     def load_existing_library(self):
         # select existing lib folder. If obj's exist, skip, or if not
-        # check for thumbnail image and load the obj's into new cells
-        file_type = "obj"
+        # load the obj's into new items. The folder scan runs in the thread
+        # pool; thumbnails are decoded by the model once they are shown.
         libfolder_le_text = self.libraryload_le.text()
 
         if not libfolder_le_text:
             self.show_folder_select_dialog()
         else:
-            files = cmds.getFileList(folder=libfolder_le_text, filespec='*.%s' % file_type)
-
-            if len(files) == 0:          
-                cmds.warning("No Files to Import")
+            self.cancel_library_load()
+
+            img_path = self.img_path or os.path.normpath(os.path.join(libfolder_le_text, "images"))
+            self.load_job = LibraryLoadJob(libfolder_le_text, img_path)
+
+            self.load_progress_bar.setRange(0, 0)
+            self.load_progress_bar.setVisible(True)
+            self.cancel_load_btn.setVisible(True)
+            self.thread_pool.start(LibraryScanTask(self.load_job, self.load_signals))
+
+    def library_files_found(self, job, found):
+        if job is not self.load_job:
+            return
+
+        if len(found) == 0:
+            cmds.warning("No Files to Import")
+            self.finish_library_load()
+            return
+
+        new_items = []
+        for obj_name, img_exists in found:
+            filename = os.path.normpath(os.path.join(job.folder, obj_name + ".obj"))
+            if self.check_obj_exists(filename)[0]:
+                print("{0} ".format(obj_name) + "already exists")
             else:
-                for f in files:
-                    obj_name = os.path.splitext(f)[0]
-                    self.create_filepath(obj_name)
-                    obj_exists = self.check_obj_exists(self.filename)[0]
-                    if not obj_exists:
-                        emptyIndex = self.find_empty_cell()
-                        obj_img_name = os.path.join(self.img_path, obj_name + ".jpg")
-                        obj_img_name = os.path.normpath(obj_img_name)
-                        img_exists = cmds.file(obj_img_name, q=True, ex=True)
-                        if img_exists:
-                            cropImage = self.create_img(obj_img_name)
-                            self.add_cell(emptyIndex, cropImage, True)
-                        else:
-                            self.add_cell(emptyIndex, None, False)
-                    else:
-                        print("{0} ".format(obj_name) + "already exists")
+                obj_img_name = os.path.normpath(os.path.join(job.img_path, obj_name + ".jpg"))
+                new_items.append((filename, obj_img_name if img_exists else None))
+
+        self.library_model.add_entries(new_items)
+        self.finish_library_load()
+
+    def cancel_library_load(self):
+        if self.load_job:
+            self.load_job.cancelled = True
+        self.finish_library_load()
+
+    def finish_library_load(self):
+        self.load_job = None
+        self.load_progress_bar.setVisible(False)
+        self.cancel_load_btn.setVisible(False)
+
+    def closeEvent(self, event):
+        self.cancel_library_load()
+        self.library_model.cancel_requests()
+        super(ModelKitDialog, self).closeEvent(event)
 
     def export_geo(self):
         # Export selected object to library directory, creating thumbnail image
@@ -201,36 +574,27 @@ class ModelKitDialog(QtWidgets.QDialog):
         self.libraryload_le.setText(self.folder_path)
 
     def overwrite_cell(self, pixmapImg, index):
-        existing_cell = (self.table_wdg.item(index[0], index[1]))
-
-        if existing_cell:
-            self.set_tooltip_and_text(existing_cell)
-            label = QtWidgets.QLabel()
-            label.setScaledContents(True)
-            label.setPixmap(pixmapImg)
-            self.table_wdg.setCellWidget(index[0], index[1], label)
+        if index < self.library_model.rowCount():
+            self.library_model.update_entry(index, self.get_snapshot_path(self.filename), pixmapImg)
 
             print("Overwrite of {0} successful at {1}".format(self.filename, index))
 
-    def create_filepath(self, obj_name):
-        self.filename = os.path.join(self.libraryload_le.text(), obj_name + ".obj")
+    def create_filepath(self, obj_name, folder=None):
+        self.filename = os.path.join(folder or self.libraryload_le.text(), obj_name + ".obj")
         self.filename = os.path.normpath(self.filename)
         
+    def get_snapshot_path(self, filename):
+        img_path = self.img_path or os.path.join(os.path.dirname(filename), "images")
+        obj_name = os.path.splitext(os.path.basename(filename))[0]
+        return os.path.normpath(os.path.join(img_path, obj_name + ".jpg"))
+
     def check_obj_exists(self, filename):
-        # Comb through table to find if object name exists in a cell's text
+        # Look up the object's row in the model's filename index
         # If not, return 'exists', index is not relevant
-        rowCount = self.table_wdg.rowCount()
-        colCount = self.table_wdg.columnCount()
-        for i in range(0, rowCount):
-            for j in range(0, colCount):
-                cellQuery = self.table_wdg.item(i,j)
-                if cellQuery and cellQuery.text() == filename:
-                    exists = True
-                    cellIndex = (i,j)
-                    return exists, cellIndex
-        exists = False
-        cellIndex = (0,0)
-        return exists, cellIndex
+        row = self.library_model.row_of(filename)
+        if row is not None:
+            return True, row
+        return False, 0
     
     def center_obj(self, selection):
         #save original xform
@@ -290,65 +654,19 @@ class ModelKitDialog(QtWidgets.QDialog):
         return imageSnapshot
 
     def create_img(self, img_path):
-        # Create pixmap image and crop
-        pixmap = QtGui.QPixmap(img_path)
-        img_size = pixmap.size()
-        img_width = img_size.width()
-        img_height = img_size.height()
-
-        if img_height > img_width:
-            crop_height = (img_height-img_width)/2
-            cropSize = QtCore.QRect(0, crop_height, img_width, img_width)
-        else:
-            crop_width = (img_width-img_height)/2
-            cropSize = QtCore.QRect(crop_width, 0, img_height, img_height)
-        
-        croppedPixmap = QtGui.QPixmap.copy(pixmap, cropSize)
-        return croppedPixmap
+        # Cropped, cell-sized pixmap from the thumbnail cache
+        return self.thumbnails.pixmap(img_path)
 
     def find_empty_cell(self):
-        rowCount = self.table_wdg.rowCount()
-        colCount = self.table_wdg.columnCount()
-
-        for i in range(0, rowCount):
-            for j in range(0, colCount):
-                cellQuery = self.table_wdg.item(i,j)
-                if not cellQuery:
-                    emptyIndex = (i,j)
-                    return emptyIndex
-                else:
-                    if i == (rowCount - 1) and j == (colCount - 1):
-                        self.table_wdg.insertRow(rowCount)
-                        self.table_wdg.setRowHeight(rowCount, 120)
-                        emptyIndex = (rowCount, 0)
-                        return emptyIndex
-
-    def set_tooltip_and_text(self, item):
-        item.setToolTip(self.filename)
-        item.setText(self.filename)
+        # New objects are appended to the library
+        return self.library_model.rowCount()
 
     def add_cell(self, emptyIndex, pixmapImg, isNew):
-        cellItem = QtWidgets.QTableWidgetItem()
-        cellItem.setFlags(cellItem.flags() & ~ QtCore.Qt.ItemIsEditable)
-        self.set_tooltip_and_text(cellItem)
-        label = QtWidgets.QLabel()
-
-        if not pixmapImg:
-            # TODO - set a better label, option to pick image or take new one
-            cellItem.setBackground(QtGui.QColor("red"))
-        else:
-            label.setScaledContents(True)
-            label.setPixmap(pixmapImg)
-        self.table_wdg.setCellWidget(emptyIndex[0], emptyIndex[1], label)
-        self.table_wdg.setItem(emptyIndex[0], emptyIndex[1], cellItem)
-
-    def get_cell_text(self, row, col):
-        cellItem = self.table_wdg.item(row, col)
-        if cellItem:
-            cell_text = cellItem.text()
-            return cell_text
-        else:
-            return None
+        # isNew: the object has a snapshot. Without a pixmap its thumbnail is
+        # decoded once the view shows it.
+        # TODO - option to pick image or take new one for objects without one
+        img_path = self.get_snapshot_path(self.filename) if isNew else None
+        self.library_model.add_entry(self.filename, img_path, pixmapImg or None)
 
     def import_object(self, obj_path):
     
@@ -379,17 +697,60 @@ class ModelKitDialog(QtWidgets.QDialog):
             #TODO - turn into error pop-up
             cmds.warning("No files found?!?")
 
-    def table_cell_clicked(self, *args):
-        row = args[0]
-        col = args[1]
-        obj_path = self.get_cell_text(row, col)
+    def library_item_clicked(self, index):
+        obj_path = index.data(LibraryModel.FILE_PATH_ROLE)
         if obj_path:
             self.import_object(obj_path)
         else:
-            cmds.warning("Chosen cell is empty!")
+            cmds.warning("Chosen item is empty!")
+
+
+def benchmark_library(count=10000):
+    # Fills the library with `count` objects the way a library load does,
+    # looks every one of them up again, then shows the view and scrolls it
+    # from top to bottom. Outside Maya, run it offscreen:
+    #     QT_QPA_PLATFORM=offscreen mayapy ModelToolLib.py --benchmark 10000
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+
+    dialog = ModelKitDialog(parent=None)
+    dialog.libraryload_le.setText(os.path.normpath("/library"))
+    names = ["asset_{0:05d}".format(i) for i in range(count)]
+
+    start_time = time.time()
+    for obj_name in names:
+        dialog.create_filepath(obj_name)
+        if not dialog.check_obj_exists(dialog.filename)[0]:
+            dialog.add_cell(dialog.find_empty_cell(), None, False)
+    fill_time = time.time() - start_time
+
+    start_time = time.time()
+    for obj_name in names:
+        dialog.create_filepath(obj_name)
+        dialog.check_obj_exists(dialog.filename)
+        dialog.find_empty_cell()
+    lookup_time = time.time() - start_time
+
+    start_time = time.time()
+    dialog.show()
+    app.processEvents()
+    dialog.library_view.scrollToBottom()
+    app.processEvents()
+    view_time = time.time() - start_time
+
+    print("{0} objects: fill {1:.3f}s, lookups {2:.3f}s, show and scroll {3:.3f}s ({4} items)".format(
+        count, fill_time, lookup_time, view_time, dialog.library_model.rowCount()))
+
+    dialog.close()
+    dialog.deleteLater()
+    return fill_time, lookup_time, view_time
+
+
+if __name__ == "__main__" and "--benchmark" in sys.argv:
 
+    args = sys.argv[sys.argv.index("--benchmark") + 1:]
+    benchmark_library(*[int(arg) for arg in args[:1]])
 
-if __name__ == "__main__":
+elif __name__ == "__main__":
 
     try:
         open_import_dialog.close()
@@ -0,0 +1,188 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+import MayapyBatch
+from MayapyBatch import timed
+
+###Headless batch retarget. Run with mayapy:
+###    mayapy TransferAnimBatch.py shots.json --workers 8 --summary summary.json
+###
+###The manifest is a list of shots (or {"shots": [...]}), each with:
+###    name, scene, target_rig, output, and optionally start, end,
+###    bind_pose_rig, head_adjustment (defaults to true) and reduce_keys
+###    (true, or a dict of reduceKeys tolerances).
+###
+###`--self-test` runs the runner against a fake maya package instead of mayapy.
+
+
+def loadManifest(path):
+
+    return MayapyBatch.loadManifest(path, 'shots')
+
+def runShot(shot):
+
+    # Worker side: runs inside a standalone mayapy session, one shot per process
+    import maya.cmds as cmds
+    import TransferAnimToNewRig as transfer
+
+    timings = {}
+    start = shot.get('start')
+    end = shot.get('end')
+
+    timed(timings, 'open', cmds.file, shot['scene'], open=True, force=True)
+
+    if start is not None and end is not None:
+        cmds.playbackOptions(min=start, max=end)
+
+    transfer.createnamespaces()
+    timed(timings, 'reference', cmds.file, shot['target_rig'], reference=True, namespace='Dynamic_Rig', mergeNamespacesOnClash=True)
+
+    if shot.get('bind_pose_rig'):
+        cmds.file(shot['bind_pose_rig'], reference=True, namespace='Temp_Rig', mergeNamespacesOnClash=True)
+        timed(timings, 'resetBones', transfer.resetBones)
+
+    targets = cmds.ls("Dynamic_Rig:*Puppet*", type='joint')
+    timed(timings, 'transferAnim', transfer.transferAnim, targets=targets, start=start, end=end)
+
+    if shot.get('head_adjustment', True):
+        timed(timings, 'headAdjustment', transfer.headAdjustment, start=start, end=end)
+
+    reduction = shot.get('reduce_keys')
+    if reduction:
+        options = reduction if isinstance(reduction, dict) else {}
+        timed(timings, 'reduceKeys', transfer.reduceKeys, targets, **options)
+
+    output = shot['output']
+    fileType = 'mayaAscii' if output.lower().endswith('.ma') else 'mayaBinary'
+    cmds.file(rename=output)
+    timed(timings, 'save', cmds.file, save=True, force=True, type=fileType)
+
+    return {'timings': timings}
+
+def runBatch(shots, workers=None, mayapy='mayapy', timeout=None, retries=1, logDir=None):
+
+    return MayapyBatch.runBatch(shots, __file__, '--worker', 'shots', workers, mayapy, timeout, retries, logDir)
+
+fakeMaya = {
+    'maya/__init__.py': "",
+    'maya/standalone.py': (
+        "def initialize(*args, **kwargs):\n"
+        "    pass\n"
+        "def uninitialize(*args, **kwargs):\n"
+        "    pass\n"
+    ),
+    # Records every call; opening a scene with 'crash' or 'hang' in its path
+    # kills or stalls the worker, saving writes the renamed output file
+    'maya/cmds.py': (
+        "import os, time\n"
+        "calls = []\n"
+        "state = {}\n"
+        "def file(*args, **kwargs):\n"
+        "    calls.append(('file', args, kwargs))\n"
+        "    if kwargs.get('open'):\n"
+        "        if 'crash' in args[0]:\n"
+        "            os._exit(3)\n"
+        "        if 'hang' in args[0]:\n"
+        "            time.sleep(600)\n"
+        "    if 'rename' in kwargs:\n"
+        "        state['output'] = kwargs['rename']\n"
+        "    if kwargs.get('save'):\n"
+        "        with open(state['output'], 'w') as outputFile:\n"
+        "            outputFile.write(repr(calls))\n"
+        "def ls(*args, **kwargs):\n"
+        "    return []\n"
+        "def __getattr__(name):\n"
+        "    def call(*args, **kwargs):\n"
+        "        calls.append((name, args, kwargs))\n"
+        "        return 0\n"
+        "    return call\n"
+    ),
+    'maya/api/__init__.py': "",
+    'maya/api/OpenMaya.py': (
+        "class MDGModifier(object):\n"
+        "    pass\n"
+    ),
+    'maya/api/OpenMayaAnim.py': (
+        "class MFnAnimCurve(object):\n"
+        "    kTangentAuto = 0\n"
+        "class MAnimCurveChange(object):\n"
+        "    pass\n"
+    ),
+}
+
+def selfTest(timeout=5):
+
+    # Drives the real runner and worker code against fakeMaya, covering two
+    # shots with the same basename, a crashing shot and a hanging one. The
+    # head adjustment reads real meshes through the API, so it is skipped
+    tempDir = tempfile.mkdtemp(prefix='TransferAnimBatch_test_')
+    fakeDir = os.path.join(tempDir, 'fake')
+    for relPath, source in fakeMaya.items():
+        path = os.path.join(fakeDir, relPath)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as sourceFile:
+            sourceFile.write(source)
+
+    shots = []
+    for scene in ['a/shot.ma', 'b/shot.ma', 'crash.ma', 'hang.ma']:
+        output = os.path.join(tempDir, scene.replace('/', '_') + '.out.ma')
+        shots.append({'scene': os.path.join(tempDir, scene), 'target_rig': 'rig.ma', 'output': output, 'start': 1, 'end': 10, 'head_adjustment': False})
+    for shot in shots:
+        shot['name'] = os.path.splitext(os.path.basename(shot['scene']))[0]
+
+    pythonPath = os.environ.get('PYTHONPATH')
+    paths = [fakeDir, os.path.dirname(os.path.abspath(__file__))]
+    os.environ['PYTHONPATH'] = os.pathsep.join(paths + ([pythonPath] if pythonPath else []))
+    try:
+        summary = runBatch(shots, workers=len(shots), mayapy=sys.executable, timeout=timeout, retries=1, logDir=os.path.join(tempDir, 'logs'))
+    finally:
+        if pythonPath is None:
+            del os.environ['PYTHONPATH']
+        else:
+            os.environ['PYTHONPATH'] = pythonPath
+
+    try:
+        first, second, crashed, hung = summary['shots']
+        assert first['status'] == second['status'] == 'ok', (first, second)
+        assert first['log'] != second['log']
+        assert os.path.isfile(shots[0]['output']) and os.path.isfile(shots[1]['output'])
+        assert 'save' in first['timings'] and 'transferAnim' in first['timings']
+        assert crashed['status'] == 'failed' and crashed['attempts'] == 2 and crashed['error'] == "exit code 3", crashed
+        assert hung['status'] == 'failed' and hung['error'].startswith("timed out"), hung
+    finally:
+        shutil.rmtree(tempDir, ignore_errors=True)
+
+    print("self test passed in {0:.1f}s".format(summary['elapsed']))
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Retarget a manifest of shots across parallel mayapy workers.")
+    parser.add_argument('manifest', nargs='?', help="JSON list of shots")
+    MayapyBatch.addRunnerArguments(parser, 'shot')
+    parser.add_argument('--self-test', action='store_true', help="run the runner against a fake maya package and exit")
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        MayapyBatch.workerMain(runShot, args.worker, args.result)
+        return 0
+
+    if args.self_test:
+        selfTest(args.timeout or 5)
+        return 0
+
+    if not args.manifest:
+        parser.error("a manifest is required")
+
+    summary = runBatch(loadManifest(args.manifest), args.workers, args.mayapy, args.timeout, args.retries, args.log_dir)
+
+    return MayapyBatch.writeSummary(summary, args.summary)
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
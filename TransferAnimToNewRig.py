@@ -1,10 +1,314 @@
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
 import maya.cmds as cmds
-from pymel.core.general import Attribute
+import maya.api.OpenMaya as om
+import maya.api.OpenMayaAnim as oma
+
+
+
+def shortName(node):
+
+    return node.split('|')[-1].split(':')[-1]
+
+def getFrameRange(start=None, end=None):
+
+    if start is None:
+        start = cmds.playbackOptions(q=True, min=True)
+    if end is None:
+        end = cmds.playbackOptions(q=True, max=True)
+
+    return list(range(int(start), int(end + 1)))
+
+def buildJointMapping(sources, targets):
+
+    # Index the source joints by short name once, so every target is matched
+    # with a single dict lookup instead of a scan of the whole list
+    sourceByName = {}
+    for bone in sources:
+        sourceByName[shortName(bone)] = bone
+
+    mapping = []
+    unmatched = []
+    for target in targets:
+        source = sourceByName.get(shortName(target))
+        if source:
+            mapping.append((source, target))
+        else:
+            unmatched.append(target)
+
+    # Parents first, so the parent's matched world matrix is known
+    # before its children are solved
+    mapping.sort(key=lambda pair: cmds.ls(pair[1], long=True)[0].count('|'))
+
+    return mapping, unmatched
+
+def sampleWorldMatrices(joints, frames):
+
+    # Evaluate through a time context instead of cmds.currentTime, so the
+    # timeline never moves and the scene is never fully re-evaluated
+    samples = {}
+    for joint in joints:
+        plug = joint + '.worldMatrix[0]'
+        samples[joint] = [om.MMatrix(cmds.getAttr(plug, time=frame)) for frame in frames]
+
+    return samples
+
+# Source animation sampled once over a frame range. trs is (frames, joints, 9)
+# local translate/rotate/scale, world is (frames, joints, 16) world matrices.
+AnimationSamples = collections.namedtuple('AnimationSamples', 'joints frames trs world')
+
+# Transform attributes that shape a world matrix besides the animation itself
+signatureAttrs = ('translate', 'rotate', 'scale', 'shear', 'rotateAxis', 'rotateOrder', 'inheritsTransform',
+                  'rotatePivot', 'rotatePivotTranslate', 'scalePivot', 'scalePivotTranslate')
+jointSignatureAttrs = ('jointOrient', 'segmentScaleCompensate')
+
+def getCurveSignature(joints):
+
+    # Hash of what the cached world matrices depend on: every key and tangent
+    # upstream of the joints and all their ancestors (animated parents,
+    # constraint and mocap targets included), and the transform attributes of
+    # those joints and ancestors. Any edit to them invalidates the cache.
+    nodes = set()
+    for path in cmds.ls(joints, long=True):
+        parts = path.split('|')
+        nodes.update('|'.join(parts[:index]) for index in range(2, len(parts) + 1))
+    nodes = sorted(nodes)
+
+    curves = cmds.ls(cmds.listHistory(nodes) or [], type='animCurve') if nodes else []
+
+    digest = hashlib.sha1()
+    for curve in sorted(set(curves)):
+        keys = cmds.keyframe(curve, q=True, tc=True, vc=True) or []
+        tangents = cmds.keyTangent(curve, q=True, ia=True, oa=True, iw=True, ow=True) or []
+        digest.update(repr((curve, keys, tangents)).encode('utf-8'))
+
+    # Read at a fixed time: animated channels are already covered by their
+    # curves, so this only picks up static values
+    for node in nodes:
+        attrs = signatureAttrs + (jointSignatureAttrs if cmds.nodeType(node) == 'joint' else ())
+        values = [cmds.getAttr(node + '.' + attr, time=0) for attr in attrs]
+        digest.update(repr((node, values)).encode('utf-8'))
+
+    return digest.hexdigest()
+
+def getCachePath(joints, frames, cacheDir=None):
+
+    if cacheDir is None:
+        cacheDir = os.path.join(tempfile.gettempdir(), 'TransferAnimCache')
+    if not os.path.isdir(cacheDir):
+        os.makedirs(cacheDir)
+
+    scene = cmds.file(q=True, sceneName=True) or 'untitled'
+    key = repr((os.path.normpath(scene), sorted(joints), frames[0], frames[-1]))
+
+    return os.path.join(cacheDir, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+def loadAnimationSamples(cachePath, signature):
+
+    metaPath = cachePath + '.json'
+    if not os.path.isfile(metaPath):
+        return None
+
+    with open(metaPath) as metaFile:
+        meta = json.load(metaFile)
+
+    if meta.get('signature') != signature:
+        return None
+
+    trs = np.load(cachePath + '_trs.npy', mmap_mode='r')
+    world = np.load(cachePath + '_world.npy', mmap_mode='r')
+
+    return AnimationSamples(meta['joints'], meta['frames'], trs, world)
+
+def sampleSourceAnimation(joints=None, start=None, end=None, cacheDir=None):
+
+    # Capture the source performance once so every retarget pass after the
+    # first reads memory-mapped arrays instead of evaluating the scene
+    if joints is None:
+        joints = cmds.ls("*Puppet_*", type='joint')
+
+    frames = getFrameRange(start, end)
+    cachePath = getCachePath(joints, frames, cacheDir)
+    signature = getCurveSignature(joints)
+
+    samples = loadAnimationSamples(cachePath, signature)
+    if samples is not None and samples.joints == list(joints):
+        return samples
+
+    # The arrays are rewritten in place, so a stale meta file must not outlive
+    # them and vouch for a half-written resample
+    metaPath = cachePath + '.json'
+    if os.path.isfile(metaPath):
+        os.remove(metaPath)
+
+    shape = (len(frames), len(joints))
+    trs = np.lib.format.open_memmap(cachePath + '_trs.npy', mode='w+', dtype=np.float64, shape=shape + (9,))
+    world = np.lib.format.open_memmap(cachePath + '_world.npy', mode='w+', dtype=np.float64, shape=shape + (16,))
+
+    for frameIndex, frame in enumerate(frames):
+        for jointIndex, joint in enumerate(joints):
+            trs[frameIndex, jointIndex, 0:3] = cmds.getAttr(joint + '.translate', time=frame)[0]
+            trs[frameIndex, jointIndex, 3:6] = cmds.getAttr(joint + '.rotate', time=frame)[0]
+            trs[frameIndex, jointIndex, 6:9] = cmds.getAttr(joint + '.scale', time=frame)[0]
+            world[frameIndex, jointIndex] = cmds.getAttr(joint + '.worldMatrix[0]', time=frame)
+
+    trs.flush()
+    world.flush()
+
+    # Written last, so an interrupted sample is never mistaken for a valid cache
+    with open(metaPath, 'w') as metaFile:
+        json.dump({'signature': signature, 'joints': list(joints), 'frames': frames}, metaFile)
+
+    return AnimationSamples(list(joints), frames, trs, world)
+
+class CurveChange(object):
+
+    # Records the API curve edits of one operation. These are not on Maya's
+    # undo queue, so they are rolled back here if the operation fails, and the
+    # queue is flushed once it succeeds: Ctrl+Z could otherwise undo the cmds
+    # steps around them and leave these keys behind. Operations that write
+    # keys through it (transferAnim, headAdjustment, reduceKeys) cannot be
+    # undone.
+
+    def __init__(self):
+        self.change = oma.MAnimCurveChange()
+        self.modifier = om.MDGModifier()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is not None:
+            self.change.undoIt()
+            self.modifier.undoIt()
+        else:
+            cmds.flushUndo()
+        return False
+
+def setCurveKeys(plug, frames, values, tangent=oma.MFnAnimCurve.kTangentAuto, change=None):
+
+    # Replace every key on the channel with one animation-curve call.
+    # Values are in internal units (radians for rotations, cm for translations).
+    # With a CurveChange, new curves and key edits are recorded in it.
+    sel = om.MSelectionList()
+    sel.add(plug)
+    mplug = sel.getPlug(0)
+
+    curveFn = oma.MFnAnimCurve()
+    curves = oma.MAnimUtil.findAnimation(mplug)
+    if len(curves):
+        curveFn.setObject(curves[0])
+    elif change is not None:
+        curveFn.create(mplug, modifier=change.modifier)
+        change.modifier.doIt()
+    else:
+        curveFn.create(mplug)
+
+    times = om.MTimeArray()
+    for frame in frames:
+        times.append(om.MTime(frame, om.MTime.uiUnit()))
+
+    curveFn.addKeys(times, values, tangent, tangent, False, change.change if change is not None else None)
+
+def solveJointRotScale(target, worldMatrices, parentMatrices):
+
+    # Local rotate/scale values that give the target the same world rotation
+    # and scale as the source, the same result as matchTransform(rot=1, scl=1)
+    rotateAxis = om.MEulerRotation([om.MAngle(v, om.MAngle.kDegrees).asRadians() for v in cmds.getAttr(target + '.rotateAxis')[0]]).asMatrix()
+    if cmds.attributeQuery('jointOrient', node=target, exists=True):
+        jointOrient = om.MEulerRotation([om.MAngle(v, om.MAngle.kDegrees).asRadians() for v in cmds.getAttr(target + '.jointOrient')[0]]).asMatrix()
+    else:
+        jointOrient = om.MMatrix()
+    rotateOrder = cmds.getAttr(target + '.rotateOrder')
+
+    rotateAxisInv = rotateAxis.inverse()
+    jointOrientInv = jointOrient.inverse()
+
+    rotations = ([], [], [])
+    scales = ([], [], [])
+    previous = None
+
+    for world, parent in zip(worldMatrices, parentMatrices):
+
+        local = om.MTransformationMatrix(world * parent.inverse())
+        rotation = local.rotation(asQuaternion=True).asMatrix()
+
+        euler = om.MTransformationMatrix(rotateAxisInv * rotation * jointOrientInv).rotation()
+        euler.reorderIt(rotateOrder)
+
+        # Keep the curves continuous across the +/-180 wrap
+        if previous is not None:
+            euler.setToClosestSolution(previous)
+        previous = euler
+
+        scale = local.scale(om.MSpace.kTransform)
+
+        for axis in range(3):
+            rotations[axis].append(euler[axis])
+            scales[axis].append(scale[axis])
+
+    return rotations, scales
+
+def transferAnim(sources=None, targets=None, start=None, end=None, samples=None):
+
+    # With samples from sampleSourceAnimation the source is read from the
+    # cache and the scene is only evaluated for unmapped target parents
+    if samples is not None:
+        sources = samples.joints
+    elif sources is None:
+        sources = cmds.ls("*Puppet_*", type='joint')
+    if targets is None:
+        targets = cmds.ls(sl=True)
+
+    mapping, unmatched = buildJointMapping(sources, targets)
+
+    for target in unmatched:
+        print("No source joint for {0}".format(target))
+
+    if samples is not None:
+        frames = samples.frames
+        columnByJoint = dict((joint, index) for index, joint in enumerate(samples.joints))
+        worldBySource = {}
+        for source, target in mapping:
+            column = samples.world[:, columnByJoint[source]]
+            worldBySource[source] = [om.MMatrix(row.tolist()) for row in column]
+    else:
+        frames = getFrameRange(start, end)
+        worldBySource = sampleWorldMatrices([pair[0] for pair in mapping], frames)
+    sourceByTarget = dict((cmds.ls(target, long=True)[0], source) for source, target in mapping)
+
+    with CurveChange() as change:
+        for source, target in mapping:
 
+            parent = cmds.listRelatives(target, parent=True, fullPath=True)
 
+            # A retargeted parent ends up with its source's world rotation and scale,
+            # so its source matrices stand in for the parent without re-evaluating
+            if not parent:
+                parentMatrices = [om.MMatrix()] * len(frames)
+            elif parent[0] in sourceByTarget:
+                parentMatrices = worldBySource[sourceByTarget[parent[0]]]
+            else:
+                parentMatrices = sampleWorldMatrices(parent, frames)[parent[0]]
 
-def transferAnim():
+            rotations, scales = solveJointRotScale(target, worldBySource[source], parentMatrices)
+
+            for axis, name in enumerate("XYZ"):
+                setCurveKeys(target + '.rotate' + name, frames, rotations[axis], change=change)
+                setCurveKeys(target + '.scale' + name, frames, scales[axis], change=change)
+
+    return mapping
+
+def transferAnimPerFrame():
     
+    # Original per-frame transfer, kept as the reference for benchmarkTransfer
     sel = cmds.ls("*Puppet_*", type='joint')
     dynamic_sel = cmds.ls(sl=True)
 
@@ -33,40 +337,158 @@ def transferAnim():
                     
                     cmds.matchTransform(x, bone, piv=0, pos=0, rot=1, scl=1)
                     cmds.setKeyframe(x)
-                    
-def resetBones():
-    
-    orig_rig = cmds.ls("*Temp_Rig:*Puppet*", type='joint')
-    new_rig = cmds.ls("*Dynamic_Rig:*Puppet*", type='joint')
 
-    for each in range(len(orig_rig)):
-        
-        old = orig_rig[each]
-        new = new_rig[each]
-        
-        cmds.select( old, r=True )
-        
-        for new_bone in new_rig:
-            
-            if old.split(":")[1] == new_bone.split(":")[1]:
-                old_rot = cmds.xform( q=True, ro=True, r=True )
-                old_pos = cmds.xform( q=True, t=True, r=True )
-                old_scl = cmds.xform( q=True, s=True, r=True )
-                
-                print(old)
-                print(new_bone)
-                
-                cmds.cutKey(new_bone, cl=True)
-                
-                new_bone = str(new_bone)
-                
-                cmds.setAttr( new_bone + ".rotate", old_rot[0], old_rot[1], old_rot[2] )
-                cmds.setAttr( new_bone + ".translate", old_pos[0], old_pos[1], old_pos[2] )
-                cmds.setAttr( new_bone + ".scale", old_scl[0], old_scl[1], old_scl[2] )
-                
-                
-def headAdjustment():
+def benchmarkTransfer(jointCount=50, frameCount=200):
+
+    # Builds a synthetic chain and a Dynamic_Rig copy in a new scene, keys the
+    # source and times the per-frame transfer against the bulk engine
+    cmds.file(new=True, force=True)
+    cmds.playbackOptions(min=1, max=frameCount)
+    cmds.namespace(add='Dynamic_Rig')
+
+    sources = []
+    targets = []
+    for prefix, joints in (("", sources), ("Dynamic_Rig:", targets)):
+        cmds.select(cl=True)
+        for each in range(jointCount):
+            joints.append(cmds.joint(name="%sPuppet_%03d_Bn" % (prefix, each), p=(0, 1, 0), r=True))
+
+    for index, bone in enumerate(sources):
+        for frame in range(1, frameCount + 1, 10):
+            for axis in "XYZ":
+                cmds.setKeyframe(bone, at='rotate' + axis, t=frame, v=((index + frame) % 90) - 45)
+
+    results = {}
+
+    cmds.select(targets, r=True)
+    startTime = time.time()
+    transferAnimPerFrame()
+    results['perFrame'] = time.time() - startTime
+
+    cmds.cutKey(targets, cl=True)
+
+    startTime = time.time()
+    transferAnim(sources, targets)
+    results['bulk'] = time.time() - startTime
+
+    print("{0} joints x {1} frames: per-frame {2:.2f}s, bulk {3:.2f}s".format(jointCount, frameCount, results['perFrame'], results['bulk']))
+
+    return results
+
+def resetBones(origPattern="*Temp_Rig:*Puppet*", newPattern="*Dynamic_Rig:*Puppet*"):
+
+    orig_rig = cmds.ls(origPattern, type='joint')
+    new_rig = cmds.ls(newPattern, type='joint')
+
+    # Match by short name through a dict instead of relying on both rigs
+    # listing their joints in the same order
+    origByName = dict((shortName(bone), bone) for bone in orig_rig)
+
+    pairs = []
+    unmatched = []
+    for new_bone in new_rig:
+        old = origByName.pop(shortName(new_bone), None)
+        if old:
+            pairs.append((old, new_bone))
+        else:
+            unmatched.append(new_bone)
+    unmatched.extend(sorted(origByName.values()))
+
+    for bone in unmatched:
+        cmds.warning("resetBones: no matching joint for {0}".format(bone))
+
+    if not pairs:
+        return pairs, unmatched
+
+    # Read every source TRS straight from the transform function set and
+    # queue every target channel on one modifier, applied with a single doIt.
+    # Values stay in internal units (cm, radians) from source to target.
+    sel = om.MSelectionList()
+    for old, new_bone in pairs:
+        sel.add(old)
+        sel.add(new_bone)
+
+    modifier = om.MDGModifier()
+    for index in range(len(pairs)):
+        transformFn = om.MFnTransform(sel.getDagPath(index * 2))
+        targetFn = om.MFnDependencyNode(sel.getDependNode(index * 2 + 1))
+        translation = transformFn.translation(om.MSpace.kTransform)
+        rotation = transformFn.rotation()
+        scale = transformFn.scale()
+        for axis, name in enumerate("XYZ"):
+            modifier.newPlugValueMDistance(targetFn.findPlug('translate' + name, False), om.MDistance(translation[axis]))
+            modifier.newPlugValueMAngle(targetFn.findPlug('rotate' + name, False), om.MAngle((rotation.x, rotation.y, rotation.z)[axis]))
+            modifier.newPlugValueDouble(targetFn.findPlug('scale' + name, False), scale[axis])
+
+    # The modifier is not on Maya's undo queue, so a failure rolls it back
+    # here and the queue is flushed afterwards: Ctrl+Z could otherwise undo
+    # the cutKey alone. resetBones cannot be undone.
+    cmds.refresh(suspend=True)
+    try:
+        cmds.cutKey([pair[1] for pair in pairs], cl=True)
+        try:
+            modifier.doIt()
+        except Exception:
+            modifier.undoIt()
+            raise
+    finally:
+        cmds.refresh(suspend=False)
+    cmds.flushUndo()
+
+    print("resetBones: reset {0} joints, {1} unmatched".format(len(pairs), len(unmatched)))
+
+    return pairs, unmatched
+
+def sampleVertexPositions(geo, anchors, frames):
+
+    # Reads the deformed world mesh through a time context for every frame,
+    # returning the averaged anchor position per frame as a (frames, 3) array
+    sel = om.MSelectionList()
+    sel.add(geo)
+    dagPath = sel.getDagPath(0)
+    dagPath.extendToShape()
+
+    plug = om.MFnDagNode(dagPath).findPlug('worldMesh', False).elementByLogicalIndex(dagPath.instanceNumber())
+    toUiUnits = om.MDistance(1.0, om.MDistance.kCentimeters).asUnits(om.MDistance.uiUnit())
+
+    positions = np.empty((len(frames), len(anchors), 3))
+    for frameIndex, frame in enumerate(frames):
+        context = om.MDGContext(om.MTime(frame, om.MTime.uiUnit()))
+        meshFn = om.MFnMesh(plug.asMObject(context))
+        for anchorIndex, vertex in enumerate(anchors):
+            point = meshFn.getPoint(vertex, om.MSpace.kObject)
+            positions[frameIndex, anchorIndex] = (point.x, point.y, point.z)
+
+    return positions.mean(axis=1) * toUiUnits
+
+def headAdjustment(anchors=(1427,), sourceGeo="Puppet_Geo", targetGeo="Dynamic_Rig:Bonbon_Geo",
+                   head="Dynamic_Rig:Puppet_Head_Bn", start=None, end=None):
+
+    # Same correction as headAdjustmentPerFrame, evaluated for the whole range
+    # in one pass and keyed with one curve write per translate channel
+    frames = getFrameRange(start, end)
+
+    delta = sampleVertexPositions(sourceGeo, anchors, frames) - sampleVertexPositions(targetGeo, anchors, frames)
+
+    translate = np.array([cmds.getAttr(head + '.translate', time=frame)[0] for frame in frames])
+    parentInverse = np.array([cmds.getAttr(head + '.parentInverseMatrix[0]', time=frame) for frame in frames]).reshape(-1, 4, 4)
+
+    # The world-space offset is brought into the head's parent space, which is
+    # what a relative world move followed by a translate key amounts to
+    translate += np.einsum('fi,fij->fj', delta, parentInverse[:, :3, :3])
+
+    toInternal = om.MDistance(1.0, om.MDistance.uiUnit()).asCentimeters()
+    with CurveChange() as change:
+        for axis, name in enumerate("XYZ"):
+            setCurveKeys(head + '.translate' + name, frames, (translate[:, axis] * toInternal).tolist(), change=change)
+
+    print("Head offset over {0} frames, max {1:.4f}".format(len(frames), np.abs(delta).max()))
+
+    return delta
+
+def headAdjustmentPerFrame():
     
+    # Original per-frame correction on a single hard-coded vertex
     minAnimTime = cmds.playbackOptions(q=True, min=True)
     maxAnimTime = cmds.playbackOptions(q=True, max=True)
 
@@ -91,16 +513,100 @@ def headAdjustment():
         
         cmds.setKeyframe( "Dynamic_Rig:Puppet_Head_Bn", at='translate')
         
+def douglasPeucker(times, values, tolerance):
+
+    # Mask of the samples to keep so that linear interpolation between them
+    # stays within tolerance. The error of every interior sample of a segment
+    # is measured at once, so the loop only runs once per kept key.
+    keep = np.zeros(len(times), dtype=bool)
+    keep[0] = keep[-1] = True
+
+    segments = [(0, len(times) - 1)]
+    while segments:
+        first, last = segments.pop()
+        if last - first < 2:
+            continue
+
+        interior = slice(first + 1, last)
+        blend = (times[interior] - times[first]) / (times[last] - times[first])
+        error = np.abs(values[interior] - (values[first] + (values[last] - values[first]) * blend))
+
+        worst = int(np.argmax(error))
+        if error[worst] > tolerance:
+            split = first + 1 + worst
+            keep[split] = True
+            segments.append((first, split))
+            segments.append((split, last))
+
+    return keep
+
+def reduceKeys(nodes=None, translateTolerance=0.01, rotateTolerance=0.1, scaleTolerance=0.001, eulerFilter=True):
+
+    # Optional pass after transferAnim/headAdjustment: fits the dense per-frame
+    # keys to the fewest linear keys within tolerance (UI units, degrees for
+    # rotations) and rewrites each curve with one call
+    if nodes is None:
+        nodes = cmds.ls("Dynamic_Rig:*Puppet*", type='joint')
+
+    # listConnections on an empty list falls back to the selection
+    if not nodes:
+        print("reduceKeys: no joints to reduce")
+        return {}
+
+    curves = cmds.ls(cmds.listConnections(nodes, s=True, d=False, type='animCurve') or [], type='animCurve')
+    curves = sorted(set(curves))
+
+    if eulerFilter:
+        rotateCurves = cmds.ls(curves, type='animCurveTA')
+        if rotateCurves:
+            cmds.filterCurve(rotateCurves, filter='euler')
+
+    toInternal = {
+        'animCurveTL': om.MDistance(1.0, om.MDistance.uiUnit()).asCentimeters(),
+        'animCurveTA': om.MAngle(1.0, om.MAngle.uiUnit()).asRadians(),
+    }
+    tolerances = {'animCurveTL': translateTolerance, 'animCurveTA': rotateTolerance}
+
+    report = {}
+    with CurveChange() as change:
+        for curve in curves:
+
+            curveType = cmds.nodeType(curve)
+            plugs = cmds.listConnections(curve + '.output', s=False, d=True, p=True)
+            times = np.array(cmds.keyframe(curve, q=True, tc=True) or [])
+            if not plugs or len(times) < 3:
+                continue
+
+            values = np.array(cmds.keyframe(curve, q=True, vc=True))
+            keep = douglasPeucker(times, values, tolerances.get(curveType, scaleTolerance))
+
+            maxError = float(np.abs(np.interp(times, times[keep], values[keep]) - values).max())
+            report[plugs[0]] = {'before': len(times), 'after': int(keep.sum()), 'maxError': maxError}
+
+            if keep.all():
+                continue
+
+            setCurveKeys(plugs[0], times[keep].tolist(), (values[keep] * toInternal.get(curveType, 1.0)).tolist(),
+                         oma.MFnAnimCurve.kTangentLinear, change)
+
+    before = sum(entry['before'] for entry in report.values())
+    after = sum(entry['after'] for entry in report.values())
+    print("reduceKeys: {0} curves, {1} -> {2} keys".format(len(report), before, after))
+
+    return report
+
 def createnamespaces():
     
     cmds.namespace( add='Dynamic_Rig' )
     cmds.namespace( add='Temp_Rig' )
     
     
-createnamespaces()
-   
-resetBones()
+if __name__ == "__main__":
+
+    createnamespaces()
+
+    resetBones()
 
-transferAnim()
+    transferAnim()
 
-headAdjustment()
\ No newline at end of file
+    headAdjustment()